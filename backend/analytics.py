@@ -0,0 +1,279 @@
+import calendar
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import changelog
+import metrics
+import rollup
+import units
+
+# Rolling per-category statistics over the daily rollup: 7/30/90-day sums
+# and means, month-to-date against the prior month, and a projected
+# end-of-month spend. Everything is kept in integer cents.
+WINDOWS = (7, 30, 90)
+
+# Days of per-day history an accumulator keeps. It covers the longest
+# window and the prior calendar month (at most 62 days back).
+HORIZON = max(max(WINDOWS), 62)
+
+# --- Batch (vectorized) ---
+def daily_matrix(daily, start_day, end_day):
+    """(categories, [category x day] cents matrix) for start_day..end_day from a rollup frame.
+
+    ``daily`` has the raw (amount_cents, category, day) shape that
+    rollup.fetch_daily_totals returns; days without spending are zeros.
+    """
+    daily = daily[(daily["day"] >= start_day) & (daily["day"] <= end_day)]
+    codes, categories = pd.factorize(daily["category"], sort=True)
+    matrix = np.zeros((len(categories), end_day - start_day + 1), dtype=np.int64)
+    days = daily["day"].to_numpy(dtype=np.int64) - start_day
+    np.add.at(matrix, (codes, days), daily["amount_cents"].to_numpy(dtype=np.int64))
+    return list(categories), matrix
+
+@metrics.timed("prepare", chart="rolling")
+def prepare_rolling_data(daily, window, start_day=None, end_day=None):
+    """Trailing ``window``-day sums per day and category, in cents, for backfills.
+
+    One cumulative sum over the whole range instead of one window sum per
+    day. Returns a day-indexed (datetime64) frame with a column per category.
+    """
+    if daily.empty:
+        return pd.DataFrame()
+    start_day = int(daily["day"].min()) if start_day is None else start_day
+    end_day = int(daily["day"].max()) if end_day is None else end_day
+    # Read window - 1 days before the range so its first sums are complete.
+    categories, matrix = daily_matrix(daily, start_day - window + 1, end_day)
+    cumulative = np.cumsum(matrix, axis=1)
+    sums = cumulative[:, window - 1:].copy()
+    sums[:, 1:] -= cumulative[:, :-window]
+    index = pd.Index(np.arange(start_day, end_day + 1).astype("datetime64[D]"), name="date")
+    return pd.DataFrame(sums.T, index=index, columns=categories)
+
+# --- Incremental ---
+class RollingStats:
+    """Sliding-window accumulators per category, advanced one day at a time.
+
+    A ring buffer keeps the last HORIZON days of per-category totals and
+    each window's running sum is updated as days enter and leave, so a new
+    day or a new transaction costs O(categories x windows), independent of
+    how much history exists. ``seq`` is the last change-log entry the
+    state reflects (None when it has to be reloaded); see changelog.py.
+
+    The windows end at ``last_day``, which only moves forward with the
+    calendar (current_summary advances it to today). Amounts dated after
+    it are held aside until the windows reach their day, so a future-dated
+    transaction or a summary for a future date never drags the live state
+    forward.
+    """
+
+    def __init__(self, windows=WINDOWS, horizon=HORIZON):
+        if max(windows) > horizon:
+            raise ValueError("horizon must cover the longest window")
+        self.windows = tuple(windows)
+        self.horizon = horizon
+        self.seq = None
+        self.last_day = None
+        self._categories = {}
+        self._ring = np.zeros((0, horizon), dtype=np.int64)
+        self._sums = np.zeros((0, len(self.windows)), dtype=np.int64)
+        self._future = {}  # (day, category) -> cents, for days after last_day
+        self._lock = threading.RLock()
+
+    # --- Loading ---
+    def load(self, daily, as_of, seq=None):
+        """Reset from a rollup frame covering at least the HORIZON days up to as_of.
+
+        Rows dated after as_of are kept aside until the windows reach them.
+        """
+        with self._lock:
+            categories, matrix = daily_matrix(daily, as_of - self.horizon + 1, as_of)
+            self._categories = {name: row for row, name in enumerate(categories)}
+            self._ring = np.zeros((len(categories), self.horizon), dtype=np.int64)
+            # Day d lives in slot d % horizon.
+            self._ring[:, (np.arange(as_of - self.horizon + 1, as_of + 1)) % self.horizon] = matrix
+            self._sums = np.stack(
+                [matrix[:, -window:].sum(axis=1) for window in self.windows], axis=1
+            ) if categories else np.zeros((0, len(self.windows)), dtype=np.int64)
+            later = daily[daily["day"] > as_of]
+            self._future = {
+                (int(day), category): int(cents)
+                for day, category, cents in zip(later["day"], later["category"], later["amount_cents"])
+            }
+            self.last_day = as_of
+            self.seq = seq
+
+    def load_from(self, conn, as_of, seq=None):
+        """load() from the rollup table: the HORIZON days up to as_of and anything dated later."""
+        daily = rollup.fetch_daily_totals(conn, as_of - self.horizon + 1)
+        self.load(daily, as_of, seq)
+
+    def copy(self):
+        """An independent accumulator in the same state."""
+        with self._lock:
+            other = RollingStats(self.windows, self.horizon)
+            other.seq = self.seq
+            other.last_day = self.last_day
+            other._categories = dict(self._categories)
+            other._ring = self._ring.copy()
+            other._sums = self._sums.copy()
+            other._future = dict(self._future)
+            return other
+
+    # --- Updates ---
+    def advance_to(self, day):
+        """Slide every window forward to end at day, bringing in amounts held for the new days."""
+        with self._lock:
+            if day <= self.last_day:
+                return
+            if day - self.last_day >= self.horizon:
+                self._ring[:] = 0
+                self._sums[:] = 0
+            else:
+                for current in range(self.last_day + 1, day + 1):
+                    for i, window in enumerate(self.windows):
+                        self._sums[:, i] -= self._ring[:, (current - window) % self.horizon]
+                    self._ring[:, current % self.horizon] = 0
+            self.last_day = day
+            arrived = [key for key in self._future if key[0] <= day]
+            for key in sorted(arrived):
+                self.add(key[0], key[1], self._future.pop(key))
+
+    def add(self, day, category, cents):
+        """Fold one transaction (negative cents for a delete) into the windows."""
+        with self._lock:
+            if day > self.last_day:
+                key = (day, category)
+                self._future[key] = self._future.get(key, 0) + cents
+                if not self._future[key]:
+                    del self._future[key]
+                return
+            age = self.last_day - day
+            if age >= self.horizon:
+                return  # older than anything the windows or months look at
+            row = self._categories.get(category)
+            if row is None:
+                row = self._categories[category] = len(self._categories)
+                self._ring = np.vstack([self._ring, np.zeros((1, self.horizon), dtype=np.int64)])
+                self._sums = np.vstack([self._sums, np.zeros((1, len(self.windows)), dtype=np.int64)])
+            self._ring[row, day % self.horizon] += cents
+            for i, window in enumerate(self.windows):
+                if age < window:
+                    self._sums[row, i] += cents
+
+    def apply(self, changes):
+        """Fold change-log entries (changelog.Change) in, in seq order.
+
+        Entries at or below ``seq`` are already in the state and skipped, so
+        replaying a batch is harmless.
+        """
+        with self._lock:
+            for change in changes:
+                if change.seq <= self.seq:
+                    continue
+                cents = change.amount_cents if change.op == "insert" else -change.amount_cents
+                self.add(change.day, change.category, cents)
+                self.seq = change.seq
+
+    def sync(self, conn):
+        """Catch up with the change log, or reload if it has never loaded or fell too far behind.
+
+        Call inside a read transaction, so the rollup read by a reload and
+        the seq it is tagged with agree.
+        """
+        with self._lock:
+            if self.seq is not None and changelog.catch_up(conn, self.seq, self.apply) is not None:
+                return
+            seq = changelog.last_seq(conn)
+            self.load_from(conn, units.date_to_day(date.today()), seq)
+
+    # --- Reads ---
+    def current_summary(self, conn, as_of):
+        """summary() at as_of, after folding in whatever the change log holds beyond ``seq``.
+
+        The live state advances to today at most. Dates before its last day
+        are answered from a throwaway accumulator loaded for them, and
+        later dates from an advanced copy.
+        """
+        began_here = not conn.in_transaction
+        if began_here:
+            conn.execute("BEGIN")
+        try:
+            with self._lock:
+                self.sync(conn)
+                self.advance_to(units.date_to_day(date.today()))
+                if as_of < self.last_day:
+                    past = RollingStats(self.windows, self.horizon)
+                    past.load_from(conn, as_of)
+                    return past.summary(as_of)
+                return self.summary(as_of)
+        finally:
+            if began_here:
+                conn.rollback()
+
+    def _days(self, first, last):
+        """Per-category totals over first..last (inclusive), from the ring."""
+        first = max(first, self.last_day - self.horizon + 1)
+        if last < first:
+            return np.zeros(len(self._categories), dtype=np.int64)
+        slots = np.arange(first, last + 1) % self.horizon
+        return self._ring[:, slots].sum(axis=1)
+
+    def summary(self, as_of):
+        """Rolling, month-to-date and projected figures as of epoch day as_of (>= last_day).
+
+        Rolling means are per calendar day (sum / window). The projection
+        carries the month-to-date run rate to the end of the month. A later
+        as_of is answered from an advanced copy; this state is not moved.
+        """
+        if as_of < self.last_day:
+            raise ValueError("summary() cannot go back before last_day; load an accumulator for that day")
+        if as_of > self.last_day:
+            ahead = self.copy()
+            ahead.advance_to(as_of)
+            return ahead.summary(as_of)
+        with self._lock:
+            today = units.EPOCH + timedelta(days=as_of)
+            month_start = units.date_to_day(today.replace(day=1))
+            days_in_month = calendar.monthrange(today.year, today.month)[1]
+            elapsed = as_of - month_start + 1
+            prior_end = month_start - 1
+            prior_start = units.date_to_day((units.EPOCH + timedelta(days=prior_end)).replace(day=1))
+
+            names = sorted(self._categories, key=self._categories.get)
+            # One row per category, then a row for all of them together.
+            def with_total(values):
+                return np.concatenate([values, values.sum(axis=0, keepdims=True)])
+
+            sums = with_total(self._sums)
+            mtd = with_total(self._days(month_start, as_of))
+            prior_to_date = with_total(self._days(prior_start, min(prior_start + elapsed - 1, prior_end)))
+            prior_total = with_total(self._days(prior_start, prior_end))
+
+            def figures(row):
+                return {
+                    "rolling": {
+                        str(window): {
+                            "sum": units.cents_to_amount(sums[row, i]),
+                            "mean": round(units.cents_to_amount(sums[row, i]) / window, 2),
+                        }
+                        for i, window in enumerate(self.windows)
+                    },
+                    "month_to_date": units.cents_to_amount(mtd[row]),
+                    "prior_month_to_date": units.cents_to_amount(prior_to_date[row]),
+                    "prior_month_total": units.cents_to_amount(prior_total[row]),
+                    "change_vs_prior": (round((mtd[row] - prior_to_date[row]) / prior_to_date[row], 4)
+                                        if prior_to_date[row] else None),
+                    "projected_month_end": units.cents_to_amount(round(mtd[row] * days_in_month / elapsed)),
+                }
+
+            return {
+                "as_of": units.day_to_date(as_of),
+                "windows": list(self.windows),
+                "month": {"start_date": units.day_to_date(month_start),
+                          "days_elapsed": elapsed, "days_in_month": days_in_month},
+                "total": figures(len(names)),
+                "categories": {name: figures(row) for row, name in enumerate(names)},
+            }
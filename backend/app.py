@@ -1,58 +1,342 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, event, or_, select
+import base64
+import csv
+from datetime import date
+import json
+import logging
+import mimetypes
 import os
-import subprocess
+import time
+
+import analytics
+import bar_plot
+import changelog
+import data_access
+import downsample
+import ingest
+import linechart
+import metrics
+import migrations
+import pie_chart
+import plot_output
+import plot_registry
+import rollup
+import storage
+import units
+import watermark
+from figure_cache import default_cache as figure_cache
+from render_queue import RenderScheduler
 
 app = Flask(__name__)
-CORS(app, supports_credentials=True)  # Allow all routes and credentials
+CORS(app, supports_credentials=True, expose_headers=['X-Next-Cursor'])  # Allow all routes and credentials
+
+# LOG_LEVEL=DEBUG turns on per-stage timings and the chart modules' debug output.
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING").upper())
 
 # Configure SQLite
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(BASE_DIR, 'database.sqlite')}"
+app.config['DATABASE_FILE'] = data_access.DB_FILE  # DATABASE_FILE env var overrides
+app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{app.config['DATABASE_FILE']}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': storage.POOL_SIZE,
+    'max_overflow': int(os.environ.get("SQLITE_POOL_OVERFLOW", 8)),
+    'connect_args': {
+        'timeout': storage.PRAGMAS['busy_timeout'] / 1000,
+        'factory': storage.InstrumentedConnection,  # SQL counts and timings in /metrics
+    },
+}
+
+# Chart rendering
+app.config['PLOT_DIR'] = os.environ.get("PLOT_DIR") or os.path.join(BASE_DIR, "static", "plots")
+app.config['RENDER_DEBOUNCE_SECONDS'] = float(os.environ.get("RENDER_DEBOUNCE_SECONDS", 2.0))
+app.config['RENDER_WORKERS'] = int(os.environ.get("RENDER_WORKERS", 4))
+# 'process' builds charts in worker processes from a shared snapshot (see render_queue.py).
+app.config['RENDER_POOL'] = os.environ.get("RENDER_POOL", "thread")
+app.config['PLOT_RETENTION'] = int(os.environ.get("PLOT_RETENTION", plot_registry.DEFAULT_RETENTION))
 
 db = SQLAlchemy(app)
 
+render_scheduler = RenderScheduler(
+    db_file=app.config['DATABASE_FILE'],
+    plot_dir=app.config['PLOT_DIR'],
+    debounce_seconds=app.config['RENDER_DEBOUNCE_SECONDS'],
+    max_workers=app.config['RENDER_WORKERS'],
+    retention=app.config['PLOT_RETENTION'],
+    processes=app.config['RENDER_POOL'] == 'process',
+)
+
+# Rolling statistics, kept current from the change log on read (see analytics.py)
+stats_engine = analytics.RollingStats()
+
 # Transaction Model
+# Amounts are stored as integer cents and dates as epoch days (see units.py);
+# the JSON API still takes and returns decimal amounts and ISO dates.
 class Transaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(255), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    amount_cents = db.Column(db.Integer, nullable=False)
     category = db.Column(db.String(50), nullable=False)
-    date = db.Column(db.String(50), nullable=False)
+    day = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = tuple(
+        db.Index(name, *columns) for name, columns in storage.INDEXES.items()
+    )
 
 # Create database tables
 with app.app_context():
+    # Every pooled connection gets WAL and the tuned pragmas.
+    event.listen(db.engine, 'connect', lambda dbapi_conn, _: storage.configure_connection(dbapi_conn))
+    conn = db.engine.raw_connection()
+    try:
+        migrations.migrate(conn)
+    finally:
+        conn.close()
     db.create_all()
+    conn = db.engine.raw_connection()
+    try:
+        storage.ensure_indexes(conn)
+        rollup.ensure_table(conn)
+        plot_registry.ensure_table(conn)
+        watermark.ensure_table(conn)
+        changelog.ensure_table(conn)
+        conn.commit()
+    finally:
+        conn.close()
+
+def _session_dbapi_connection():
+    """DB-API connection bound to the current session's transaction."""
+    return db.session.connection().connection
+
+# --- Transaction Queries ---
+TRANSACTION_COLUMNS = ('id', 'description', 'amount_cents', 'category', 'day')
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 1000
+
+def _parse_date_arg(args, name):
+    value = args.get(name)
+    if value is not None:
+        units.date_to_day(value)  # validates YYYY-MM-DD
+    return value
+
+def _parse_day_arg(args, name):
+    value = args.get(name)
+    return None if value is None else units.date_to_day(value)
+
+def _transaction_filters(args):
+    """Translate query-string filters into SQL conditions (raises ValueError)."""
+    table = Transaction.__table__
+    conditions = []
+
+    start_day = _parse_day_arg(args, 'start_date')
+    if start_day is not None:
+        conditions.append(table.c.day >= start_day)
+    end_day = _parse_day_arg(args, 'end_date')
+    if end_day is not None:
+        conditions.append(table.c.day <= end_day)
+
+    categories = args.getlist('category')
+    if categories:
+        conditions.append(table.c.category.in_(categories))
+
+    min_amount = args.get('min_amount')
+    if min_amount is not None:
+        conditions.append(table.c.amount_cents >= units.min_amount_to_cents(min_amount))
+    max_amount = args.get('max_amount')
+    if max_amount is not None:
+        conditions.append(table.c.amount_cents <= units.max_amount_to_cents(max_amount))
+
+    return conditions
+
+def _encode_cursor(row, order_by):
+    key = [row.id] if order_by == 'id' else [row.day, row.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def _cursor_condition(cursor, order_by):
+    """Keyset condition selecting the rows strictly after the cursor."""
+    table = Transaction.__table__
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if order_by == 'id':
+            (last_id,) = key
+            return table.c.id > int(last_id)
+        last_day, last_id = key
+        return or_(
+            table.c.day > int(last_day),
+            and_(table.c.day == int(last_day), table.c.id > int(last_id)),
+        )
+    except (ValueError, TypeError) as exc:
+        raise ValueError('Invalid cursor') from exc
+
+def _transactions_statement(args, order_by):
+    table = Transaction.__table__
+    stmt = select(*(table.c[name] for name in TRANSACTION_COLUMNS))
+
+    conditions = _transaction_filters(args)
+    cursor = args.get('cursor')
+    if cursor:
+        conditions.append(_cursor_condition(cursor, order_by))
+    if conditions:
+        stmt = stmt.where(*conditions)
+
+    if order_by == 'id':
+        return stmt.order_by(table.c.id)
+    return stmt.order_by(table.c.day, table.c.id)
+
+def _stream_rows(engine, stmt):
+    """Yield result rows straight off the database cursor, one batch at a time."""
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=STREAM_BATCH_SIZE).execute(stmt)
+        for row in result:
+            yield row
+
+def _row_to_api(row):
+    return units.to_api(row._mapping)
+
+def _row_to_json(row):
+    return json.dumps(_row_to_api(row))
+
+def _ndjson_lines(rows):
+    for row in rows:
+        yield _row_to_json(row) + '\n'
+
+def _json_array_chunks(rows):
+    yield '['
+    first = True
+    for row in rows:
+        yield _row_to_json(row) if first else ',' + _row_to_json(row)
+        first = False
+    yield ']'
 
 @app.route('/transactions', methods=['GET'])
 def get_transactions():
-    transactions = Transaction.query.all()
-    return jsonify([{
-        'id': t.id,
-        'description': t.description,
-        'amount': t.amount,
-        'category': t.category,
-        'date': t.date
-    } for t in transactions])
+    """List transactions.
+
+    Without ``limit`` every matching row is streamed back (a chunked JSON
+    array, or NDJSON with ``format=ndjson``). With ``limit`` a single
+    keyset page is returned together with a ``next_cursor`` to pass back as
+    ``cursor``. Rows can be ordered by ``id`` (default) or ``date`` and
+    filtered by ``start_date``/``end_date``, ``category`` (repeatable) and
+    ``min_amount``/``max_amount``.
+    """
+    order_by = request.args.get('order_by', 'id')
+    output_format = request.args.get('format', 'json')
+    if order_by not in ('id', 'date'):
+        return jsonify({'error': "order_by must be 'id' or 'date'"}), 400
+    if output_format not in ('json', 'ndjson'):
+        return jsonify({'error': "format must be 'json' or 'ndjson'"}), 400
+
+    try:
+        stmt = _transactions_statement(request.args, order_by)
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    limit = request.args.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+
+    if limit is None:
+        rows = _stream_rows(db.engine, stmt)
+        if output_format == 'ndjson':
+            return Response(stream_with_context(_ndjson_lines(rows)), mimetype='application/x-ndjson')
+        return Response(stream_with_context(_json_array_chunks(rows)), mimetype='application/json')
+
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+
+    # Fetch one extra row to learn whether another page follows.
+    rows = db.session.execute(stmt.limit(limit + 1)).all()
+    next_cursor = _encode_cursor(rows[limit - 1], order_by) if len(rows) > limit else None
+    rows = rows[:limit]
+
+    if output_format == 'ndjson':
+        response = Response(_ndjson_lines(rows), mimetype='application/x-ndjson')
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
+    return jsonify({
+        'transactions': [_row_to_api(row) for row in rows],
+        'next_cursor': next_cursor,
+    })
 
 @app.route('/transactions', methods=['POST'])
 def add_transaction():
     data = request.json
-    new_transaction = Transaction(
-        description=data['description'],
-        amount=data['amount'],
-        category=data['category'],
-        date=data['date']
-    )
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected an object with transaction fields'}), 400
+    try:
+        new_transaction = Transaction(
+            description=data['description'],
+            amount_cents=units.amount_to_cents(data['amount']),
+            category=data['category'],
+            day=units.date_to_day(data['date'])
+        )
+    except KeyError as exc:
+        return jsonify({'error': f"Missing required field '{exc.args[0]}'"}), 400
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
     db.session.add(new_transaction)
+    db.session.flush()
+    conn = _session_dbapi_connection()
+    rollup.apply_insert(conn, [
+        (new_transaction.day, new_transaction.category, new_transaction.amount_cents)
+    ])
+    watermark.bump(conn)
     db.session.commit()
 
-    subprocess.run(["python", "backend/updategraph.py"])
-    
+    render_scheduler.notify()
+
     return jsonify({'message': 'Transaction added!', 'id': new_transaction.id}), 201
 
+def rollup_batch_updater(conn):
+    """on_batch hook for ingest: fold each batch into the rollup and bump the watermark."""
+    columns = [column.name for column in ingest.insert_columns(Transaction.__table__)]
+    update_rollup = rollup.batch_updater(conn, columns)
+
+    def apply(batch):
+        update_rollup(batch)
+        watermark.bump(conn)
+
+    return apply
+
+@app.route('/transactions/bulk', methods=['POST'])
+def add_transactions_bulk():
+    """Import many transactions at once from a JSON array, CSV or NDJSON body.
+
+    The format comes from ``format`` or the Content-Type header. Invalid
+    rows are reported per row; valid rows are inserted in batches of
+    ``batch_size`` inside a single transaction, followed by one chart
+    refresh. An empty body inserts nothing and is not an error; the
+    request fails with 400 only when every row was rejected.
+    """
+    fmt = request.args.get('format') or ingest.detect_format(request.content_type) or 'json'
+    try:
+        batch_size = int(request.args.get('batch_size', ingest.DEFAULT_BATCH_SIZE))
+    except ValueError:
+        return jsonify({'error': 'batch_size must be an integer'}), 400
+    try:
+        records = ingest.read_records(request.stream, fmt)
+        conn = db.engine.raw_connection()
+        try:
+            report = ingest.insert_records(
+                conn, Transaction.__table__, records, batch_size,
+                on_batch=rollup_batch_updater(conn),
+            )
+        finally:
+            conn.close()
+    except (ValueError, csv.Error) as exc:
+        return jsonify({'error': str(exc)}), 400
+
+    if report['inserted']:
+        render_scheduler.notify()
+        return jsonify(report), 201
+    return jsonify(report), 400 if report['error_count'] else 200
+
 @app.route('/transactions/<int:id>', methods=['DELETE', 'OPTIONS'])
 def delete_transaction(id):
     if request.method == 'OPTIONS':  # Handle preflight request
@@ -65,7 +349,12 @@ def delete_transaction(id):
     transaction = Transaction.query.get(id)
     if transaction:
         db.session.delete(transaction)
+        db.session.flush()
+        conn = _session_dbapi_connection()
+        rollup.apply_delete(conn, transaction.day, transaction.category, transaction.amount_cents)
+        watermark.bump(conn)
         db.session.commit()
+        render_scheduler.notify()
         response = jsonify({'message': 'Transaction deleted successfully'})
     else:
         response = jsonify({'error': 'Transaction not found'}), 404
@@ -73,25 +362,246 @@ def delete_transaction(id):
     response.headers.add('Access-Control-Allow-Origin', '*')
     return response
 
-@app.route("/latest_plot/<plot_type>")
-def latest_plot(plot_type):
-    plot_dir = os.path.join(BASE_DIR, "static", "plots")
+@app.route('/rollup/rebuild', methods=['POST'])
+def rebuild_rollup():
+    conn = db.engine.raw_connection()
+    try:
+        rollup.rebuild(conn)
+        watermark.bump(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    render_scheduler.notify()
+    return jsonify({'message': 'Rollup rebuilt'})
 
-    # Ensure the directory exists
-    if not os.path.exists(plot_dir):
-        return jsonify({"error": "Plot directory does not exist"}), 404
+@app.route('/pie_slices')
+def pie_slices():
+    """Category totals for one pie slice, fetched lazily by the pie chart.
 
-    # Find the latest file matching the plot type
-    files = sorted(
-        [f for f in os.listdir(plot_dir) if plot_type in f],
-        key=lambda x: os.path.getmtime(os.path.join(plot_dir, x)),
-        reverse=True
-    )
+    Pass ``period`` (Month or Week) with a year-qualified ``key`` such as
+    202503, or a custom ``start_date``/``end_date`` range.
+    """
+    period = request.args.get('period')
+    try:
+        if period:
+            key = int(request.args['key'])
+            start_date, end_date = pie_chart.period_range(period, key)
+            label = pie_chart.period_label(period, key)
+        else:
+            start_date = _parse_date_arg(request.args, 'start_date')
+            end_date = _parse_date_arg(request.args, 'end_date')
+            if start_date is None or end_date is None:
+                raise ValueError('Pass period and key, or start_date and end_date')
+            label = f'{start_date} to {end_date}'
+    except (KeyError, ValueError) as exc:
+        return jsonify({'error': str(exc)}), 400
+
+    conn = db.engine.raw_connection()
+    try:
+        rows = rollup.fetch_category_totals(
+            conn, units.date_to_day(start_date), units.date_to_day(end_date)
+        )
+    finally:
+        conn.close()
+
+    return jsonify({
+        'label': label,
+        'start_date': start_date,
+        'end_date': end_date,
+        'labels': [category for category, _ in rows],
+        'values': [units.cents_to_amount(total) for _, total in rows],
+        'colors': [pie_chart.COLORS.get(category, pie_chart.DEFAULT_COLOR) for category, _ in rows],
+    })
+
+MAX_ROLLING_WINDOW = 366
+
+@app.route('/analytics/summary')
+def analytics_summary():
+    """Rolling 7/30/90-day sums and means, month-to-date vs the prior month and the
+    projected month-end spend, per category and in total, as of ``as_of`` (default today).
+    """
+    try:
+        as_of = _parse_day_arg(request.args, 'as_of')
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    if as_of is None:
+        as_of = units.date_to_day(date.today())
+
+    conn = db.engine.raw_connection()
+    try:
+        summary = stats_engine.current_summary(conn.driver_connection, as_of)
+    finally:
+        conn.close()
+    return jsonify(summary)
+
+@app.route('/analytics/rolling')
+def analytics_rolling():
+    """Trailing ``window``-day sums per day and category between ``start_date`` and
+    ``end_date`` (default: all data), optionally limited to ``category`` (repeatable).
+    """
+    try:
+        window = int(request.args.get('window', 30))
+        if not 1 <= window <= MAX_ROLLING_WINDOW:
+            raise ValueError(f'window must be between 1 and {MAX_ROLLING_WINDOW}')
+        start_day = _parse_day_arg(request.args, 'start_date')
+        end_day = _parse_day_arg(request.args, 'end_date')
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+    categories = request.args.getlist('category') or None
+
+    conn = db.engine.raw_connection()
+    try:
+        if start_day is None or end_day is None:
+            first_day, last_day, _ = rollup.fetch_bounds(conn)
+            start_day = first_day if start_day is None else start_day
+            end_day = last_day if end_day is None else end_day
+        daily = None
+        if start_day is not None and end_day is not None and start_day <= end_day:
+            daily = rollup.fetch_daily_totals(conn.driver_connection, start_day - window + 1, end_day, categories)
+    finally:
+        conn.close()
+
+    if daily is None or daily.empty:
+        return jsonify({'window': window, 'dates': [], 'series': {}})
+    sums = analytics.prepare_rolling_data(daily, window, start_day, end_day)
+    return jsonify({
+        'window': window,
+        'dates': [units.day_to_date(day) for day in range(start_day, end_day + 1)],
+        'series': {category: [units.cents_to_amount(cents) for cents in sums[category]]
+                   for category in sums.columns},
+    })
+
+SERIES_CHARTS = {
+    'bar': bar_plot.create_bar_chart,
+    'line': linechart.create_chart,
+}
+
+@app.route('/chart_series/<chart>')
+def chart_series(chart):
+    """Traces for a window of the bar or line chart, fetched when the chart is zoomed.
+
+    ``start_date``/``end_date`` bound the window (either may be omitted) and
+    ``points`` overrides the per-trace point budget. The resolution is
+    picked for the window, so zooming in goes from months down to days.
+    """
+    if chart not in SERIES_CHARTS:
+        return jsonify({'error': f'Unknown chart: {chart}'}), 404
+    try:
+        start_date = _parse_date_arg(request.args, 'start_date')
+        end_date = _parse_date_arg(request.args, 'end_date')
+        points = int(request.args.get('points', downsample.DEFAULT_POINT_BUDGET))
+        if not 2 < points <= 10 * downsample.DEFAULT_POINT_BUDGET:
+            raise ValueError(f'points must be between 3 and {10 * downsample.DEFAULT_POINT_BUDGET}')
+    except ValueError as exc:
+        return jsonify({'error': str(exc)}), 400
+
+    conn = db.engine.raw_connection()
+    try:
+        version = watermark.read(conn)
+        params = {'start_date': start_date, 'end_date': end_date, 'points': points}
+        fig = figure_cache.get_or_build(
+            f'{chart}-window', params, version,
+            lambda: SERIES_CHARTS[chart](
+                data_access.daily_pivot(
+                    # pandas wants the sqlite3 connection itself, not the pool's proxy
+                    data_access.fetch_daily_totals(conn.driver_connection, start_date, end_date)
+                ),
+                point_budget=points,
+            ),
+        )
+    finally:
+        conn.close()
 
-    if files:
-        return send_from_directory(plot_dir, files[0])
+    return jsonify({
+        'chart': chart,
+        'data_version': version,
+        'resolution': fig.layout.meta['resolution'],
+        'title': fig.layout.title.text,
+        'style': fig.layout.meta['style'],
+        'traces': [
+            {'name': trace.name, 'x': trace.x.tolist(), 'y': trace.y.tolist()}
+            for trace in fig.data
+        ],
+    })
 
-    return jsonify({"error": "No plot found"}), 404
+# --- Instrumentation ---
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Streamed bodies are timed up to the first chunk and have no known size.
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe_request(route, request.method, response.status_code,
+                                time.perf_counter() - started, response.content_length)
+    return response
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Stage, SQL and request metrics for this process, in the Prometheus text format."""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route("/render_status")
+def render_status():
+    return jsonify(render_scheduler.status())
+
+@app.route("/cache_status")
+def cache_status():
+    conn = db.engine.raw_connection()
+    try:
+        data_version = watermark.read(conn)
+    finally:
+        conn.close()
+    return jsonify({'data_version': data_version, 'figures': figure_cache.stats()})
+
+# --- Static Plot Serving ---
+ASSET_MAX_AGE = 365 * 24 * 60 * 60
+
+def _send_precompressed(directory, filename, max_age=None, etag=True):
+    """send_from_directory, preferring a precompressed .br/.gz sibling the client accepts.
+
+    Werkzeug handles ETag/If-None-Match and Range for whichever variant is
+    sent. A string ``etag`` (e.g. a content hash) is suffixed per encoding.
+    """
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in plot_output.COMPRESSED_VARIANTS:
+        if request.accept_encodings[encoding] and os.path.exists(os.path.join(directory, filename + suffix)):
+            variant_etag = f'{etag}-{encoding}' if isinstance(etag, str) else etag
+            response = send_from_directory(directory, filename + suffix, mimetype=mimetype,
+                                           max_age=max_age, etag=variant_etag)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(directory, filename, mimetype=mimetype, max_age=max_age, etag=etag)
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route("/assets/<path:filename>")
+def plot_asset(filename):
+    """Shared, versioned plot assets (the plotly.js bundle), cached for a year."""
+    response = _send_precompressed(plot_output.ASSET_DIR, filename, max_age=ASSET_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+@app.route("/latest_plot/<plot_type>")
+def latest_plot(plot_type):
+    conn = db.engine.raw_connection()
+    try:
+        artifact = plot_registry.latest(conn, plot_type)
+    finally:
+        conn.close()
+
+    if artifact is None:
+        return jsonify({"error": "No plot found"}), 404
+
+    # The latest version moves on every render, so clients revalidate by ETag.
+    response = _send_precompressed(app.config['PLOT_DIR'], artifact['path'], etag=artifact['content_hash'])
+    response.cache_control.no_cache = True
+    response.headers['X-Plot-Version'] = str(artifact['version'])
+    return response
 
 
 if __name__ == '__main__':
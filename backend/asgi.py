@@ -0,0 +1,158 @@
+"""Production ASGI entry point for the Flask API.
+
+    python asgi.py --workers 4 --threads 16 --port 5000
+    uvicorn asgi:application --workers 4
+
+The Flask routes run unchanged through a2wsgi's WSGIMiddleware on a
+bounded thread pool (``--threads`` / ASGI_THREADS per process), so the
+number of requests doing blocking ORM or SQLite work at once is capped
+while the event loop keeps accepting connections. Plot and asset files are
+not read on that pool: Flask only resolves the file and its headers
+(registry lookup, ETag, encoding) and hands back an X-Sendfile header, and
+SendfileMiddleware streams the file body from the event loop.
+``--workers`` / ASGI_WORKERS starts that many processes.
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import re
+import sys
+
+DEFAULT_THREADS = 16
+DEFAULT_WORKERS = 1
+
+# Response messages buffered between a WSGI thread and the event loop.
+MAX_BUFFERED_CHUNKS = 16
+SENDFILE_CHUNK = 256 * 1024
+
+_CONTENT_RANGE = re.compile(rb"bytes (\d+)-(\d+)/")
+
+# --- X-Sendfile ---
+def split_sendfile(status, headers):
+    """Strip X-Sendfile from ASGI headers; return (headers, path or None, (offset, length) or None)."""
+    path = next((value.decode("latin-1") for name, value in headers if name.lower() == b"x-sendfile"), None)
+    if path is None:
+        return headers, None, None
+    # Werkzeug dates file responses itself; the ASGI server sends its own.
+    kept = [(name, value) for name, value in headers if name.lower() not in (b"x-sendfile", b"date")]
+    span = None
+    if status not in (200, 206):
+        return kept, None, None
+    for name, value in kept:
+        if name.lower() == b"content-range":
+            match = _CONTENT_RANGE.match(value)
+            if match:
+                start, end = int(match.group(1)), int(match.group(2))
+                span = (start, end - start + 1)
+    return kept, path, span
+
+class SendfileMiddleware:
+    """ASGI middleware that serves X-Sendfile responses of the wrapped app.
+
+    The wrapped app's (empty) body for such a response is dropped and the
+    named file, or the byte range its Content-Range gives, is streamed in
+    SENDFILE_CHUNK pieces instead. File reads go to the loop's default
+    executor, never the request pool, and stop if the client disconnects.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        sendfile = {}
+
+        async def send_or_hold(message):
+            if message["type"] == "http.response.start":
+                headers, path, span = split_sendfile(message["status"], message.get("headers", []))
+                if path is not None:
+                    sendfile.update(path=path, span=span)
+                    message = dict(message, headers=headers)
+                await send(message)
+            elif not sendfile:
+                await send(message)
+
+        await self.app(scope, receive, send_or_hold)
+        if not sendfile:
+            return
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        await self._send_file(sendfile["path"], sendfile["span"], receive, send)
+
+    @staticmethod
+    async def _send_file(path, span, receive, send):
+        loop = asyncio.get_running_loop()
+        disconnected = asyncio.Event()
+
+        # The app has returned, so nothing else is reading from receive.
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        watcher = loop.create_task(watch_disconnect())
+        offset, remaining = span or (0, None)
+        file = await loop.run_in_executor(None, open, path, "rb")
+        try:
+            if offset:
+                await loop.run_in_executor(None, file.seek, offset)
+            while not disconnected.is_set():
+                size = SENDFILE_CHUNK if remaining is None else min(SENDFILE_CHUNK, remaining)
+                chunk = await loop.run_in_executor(None, file.read, size) if size else b""
+                if remaining is not None:
+                    remaining -= len(chunk)
+                last = not chunk or remaining == 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": not last})
+                if last:
+                    break
+        finally:
+            watcher.cancel()
+            await loop.run_in_executor(None, file.close)
+
+# --- Application ---
+def create_application(max_threads=None):
+    from a2wsgi import WSGIMiddleware
+
+    from app import app
+
+    # Flask resolves plot and asset files; SendfileMiddleware streams them.
+    app.config["USE_X_SENDFILE"] = True
+    return SendfileMiddleware(WSGIMiddleware(
+        app, workers=max_threads or int(os.environ.get("ASGI_THREADS", DEFAULT_THREADS)),
+        send_queue_size=MAX_BUFFERED_CHUNKS,
+    ))
+
+# Built on import by the server; ``python asgi.py`` only launches uvicorn,
+# which imports this module again to get it.
+if __name__ != "__main__":
+    application = create_application()
+
+# --- Main Execution ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the Finance Tracker API over ASGI (uvicorn).")
+    parser.add_argument("--host", default=os.environ.get("ASGI_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("ASGI_PORT", 5000)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("ASGI_WORKERS", DEFAULT_WORKERS)),
+                        help="worker processes")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("ASGI_THREADS", DEFAULT_THREADS)),
+                        help="blocking-work threads per worker")
+    args = parser.parse_args(argv)
+
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("The ASGI server needs uvicorn: pip install uvicorn")
+    if importlib.util.find_spec("a2wsgi") is None:
+        sys.exit("The ASGI server needs a2wsgi: pip install a2wsgi")
+
+    # Worker processes import this module afresh and read the pool size from here.
+    os.environ["ASGI_THREADS"] = str(args.threads)
+    uvicorn.run("asgi:application", host=args.host, port=args.port,
+                workers=args.workers, log_level="warning")
+
+if __name__ == "__main__":
+    main()
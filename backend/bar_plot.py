@@ -1,28 +1,42 @@
-import sqlite3
 import pandas as pd
 import plotly.graph_objs as go
-import plotly.offline as pyo
 from datetime import datetime, timedelta
 
-# --- Database Connection ---
-def connect_to_db(db_file):
-    return sqlite3.connect(db_file)
-
-# --- Fetch Data from Database ---
-def fetch_data_from_db(conn):
-    query = """
-    SELECT amount, category, date FROM "transaction"
-    """
-    return pd.read_sql_query(query, conn)
+import data_access
+import downsample
+import metrics
+import plot_output
+from figure_cache import default_cache
 
 # --- Data Preparation ---
+@metrics.timed("prepare", chart="bar")
 def prepare_data_for_plot(df):
-    df["date"] = pd.to_datetime(df["date"])
-    df_pivot = df.pivot_table(index="date", columns="category", values="amount", aggfunc="sum").fillna(0)
+    """Date x category pivot of a transaction frame or a data_access.TransactionStream."""
+    df = data_access.as_chart_frame(df)
+    dates = pd.to_datetime(df["date"])  # no-op for frames from data_access
+    df_pivot = df.pivot_table(index=dates, columns="category", values="amount", aggfunc="sum").fillna(0)
     return df_pivot
 
+# Thick outlines merge into a black smear once bars get narrow.
+OUTLINE_MAX_BARS = 120
+
+def bar_style(n_bars):
+    """Per-trace attributes that depend on how many bars are drawn."""
+    return {"marker.line.width": 3 if n_bars <= OUTLINE_MAX_BARS else 0}
+
 # --- Plotly Visualization ---
-def create_bar_chart(df_pivot):
+@metrics.timed("create", chart="bar")
+def create_bar_chart(df_pivot, point_budget=downsample.DEFAULT_POINT_BUDGET, series_url=None):
+    """Stacked bars per category, bucketed to at most point_budget bars.
+
+    ``point_budget=None`` draws every day. With ``series_url`` set, the page
+    script in downsample.ZOOM_SCRIPT refetches the zoomed window from it.
+    """
+    resolution = "day"
+    if point_budget:
+        df_pivot, resolution = downsample.downsample_pivot(df_pivot, point_budget)
+    style = bar_style(len(df_pivot.index))
+
     colors = {
         "Housing": "#4173CD",       # Blue
         "Food": "#28A745",          # Green
@@ -33,16 +47,17 @@ def create_bar_chart(df_pivot):
         "Others": "#808080"         # Gray
     }
     
+    x_values = plot_output.date_axis_values(df_pivot.index)
     data = []
     for category in df_pivot.columns:
         data.append(
             go.Bar(
-                x=df_pivot.index, 
-                y=df_pivot[category],
+                x=x_values,
+                y=df_pivot[category].to_numpy(),
                 name=category,
                 marker=dict(
                     color=colors.get(category, "#A9A9A9"),
-                    line=dict(width=3, color="black")  # Thick black border
+                    line=dict(width=style["marker.line.width"], color="black")  # Thick black border
                 ),
                 hovertemplate=(
                     f"<b>{category}</b><br>"
@@ -53,9 +68,11 @@ def create_bar_chart(df_pivot):
         )
     
     layout = go.Layout(
-        title="Spending Categories Over Time",
+        title=downsample.titled("Spending Categories Over Time", resolution),
+        meta={"resolution": resolution, "series_url": series_url, "style": style},
         barmode="stack",
         xaxis=dict(
+            type="date",
             tickangle=45,
             showgrid=True,
             tickformat="%b %d",
@@ -87,11 +104,32 @@ def create_bar_chart(df_pivot):
     fig = go.Figure(data=data, layout=layout)
     return fig
 
+# --- Render to File ---
+SERIES_URL = "/chart_series/bar"
+
+def render_chart(cycle, filename, standalone=False):
+    """Build the stacked bar chart from the cycle's shared data and write it to filename.
+
+    A ``standalone`` file cannot reach SERIES_URL, so it embeds every day of
+    the cycle's range instead of a downsampled view that refines on zoom.
+    """
+    if standalone:
+        point_budget, series_url, post_script = None, None, None
+    else:
+        point_budget, series_url, post_script = downsample.DEFAULT_POINT_BUDGET, SERIES_URL, downsample.ZOOM_SCRIPT
+    params = {"points": point_budget, "series_url": series_url, **cycle.filters}
+    fig = default_cache.get_or_build(
+        "bar", params, cycle.watermark(),
+        lambda: create_bar_chart(cycle.daily_pivot(), point_budget=point_budget, series_url=series_url),
+    )
+    plot_output.write_figure(fig, filename, post_script=post_script, chart="bar",
+                             standalone=standalone)
+    return filename
+
 # --- Main Execution ---
 if __name__ == "__main__":
-    db_connection = connect_to_db("database.sqlite")
-    df = fetch_data_from_db(db_connection)
-    db_connection.close()
-    df_pivot = prepare_data_for_plot(df)
-    fig = create_bar_chart(df_pivot)
-    pyo.plot(fig, filename="static\plots\cartoonish_stacked_bar.htmlcartoonish_stacked_bar.html")
+    # Same as: python render.py bar [options]
+    import sys
+
+    import render
+    sys.exit(render.main(["bar", *sys.argv[1:]]))
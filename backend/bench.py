@@ -0,0 +1,321 @@
+"""Benchmark harness for the chart pipeline and the API.
+
+Builds seeded synthetic datasets and times each pipeline stage on its own
+for every dataset:
+- fetch: the transaction read (SQL, and the Parquet snapshot when pyarrow
+  is installed) and the rollup read.
+- prepare: every prepare_* function and the daily pivot.
+- create: every create_* figure builder.
+- serialize: HTML serialization of each figure.
+
+Optionally it also loads the /transactions and /latest_plot endpoints with
+concurrent clients (see bench_serving.py). Results are written as JSON, and
+two result files can be compared to catch regressions between commits.
+
+    python bench.py --rows 10k,100k,1m --categories 20 --years 5 --json results.json
+    python bench.py --rows 100k --load --json results.json
+    python bench.py --compare baseline.json results.json
+"""
+import argparse
+import fnmatch
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timezone
+
+import numpy as np
+import pandas as pd
+import plotly
+import plotly.io as pio
+
+import bar_plot
+import changelog
+import columnar
+import data_access
+import heatmap
+import linechart
+import pie_chart
+import plot_output
+import rollup
+import storage
+import watermark
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_DATA_DIR = os.path.join(BASE_DIR, ".bench-data")
+
+# The app's own categories first (they have fixed chart colours), then filler.
+BASE_CATEGORIES = ['Housing', 'Food', 'Transportation', 'Entertainment', 'Healthcare', 'Shopping', 'Others']
+LAST_DAY = date(2024, 12, 31)
+INSERT_CHUNK = 200_000
+
+# --- Datasets ---
+def parse_count(text):
+    """'10k' -> 10000, '1.5m' -> 1500000."""
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+def category_names(count):
+    names = BASE_CATEGORIES[:count]
+    return names + [f"Category {i:03d}" for i in range(len(names) + 1, count + 1)]
+
+def dataset_path(data_dir, rows, categories, years, seed):
+    return os.path.join(data_dir, f"bench-{rows}r-{categories}c-{years}y-s{seed}.sqlite")
+
+def synthesize(db_file, rows, categories=20, years=5, seed=0):
+    """Write a seeded dataset of ``rows`` transactions to a new database.
+
+    Days are uniform over ``years`` years ending 2024-12-31, categories
+    follow a Zipf-like popularity curve and amounts are log-normal cents,
+    so the same arguments always produce the same database.
+    """
+    if os.path.exists(db_file):
+        os.remove(db_file)
+    # Importing the app creates the current schema in DATABASE_FILE.
+    subprocess.run([sys.executable, "-c", "import app"], cwd=BASE_DIR, check=True,
+                   env=dict(os.environ, DATABASE_FILE=db_file), stdout=subprocess.DEVNULL)
+
+    rng = np.random.default_rng(seed)
+    names = np.array(category_names(categories), dtype=object)
+    weights = 1 / np.arange(1, categories + 1)
+    weights /= weights.sum()
+    last_day = (LAST_DAY - date(1970, 1, 1)).days
+    first_day = last_day - 365 * years + 1
+
+    conn = storage.connect(db_file)
+    conn.execute("PRAGMA synchronous=OFF")  # scratch data; rebuilt on failure
+    try:
+        for start in range(0, rows, INSERT_CHUNK):
+            n = min(INSERT_CHUNK, rows - start)
+            days = rng.integers(first_day, last_day + 1, n)
+            cats = names[rng.choice(categories, n, p=weights)]
+            cents = np.maximum(rng.lognormal(8.0, 1.0, n).astype(np.int64), 1)
+            descriptions = (f"txn {i}" for i in range(start, start + n))
+            conn.executemany(
+                'INSERT INTO "transaction" (description, amount_cents, category, day) VALUES (?, ?, ?, ?)',
+                zip(descriptions, cents.tolist(), cats.tolist(), days.tolist()),
+            )
+        conn.commit()
+        # The seed rows are history, not changes any consumer has to replay.
+        changelog.prune(conn, retention=1)
+        rollup.rebuild(conn)
+        watermark.ensure_table(conn)
+        watermark.bump(conn)
+        storage.ensure_indexes(conn)
+        conn.commit()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    return db_file
+
+def ensure_dataset(data_dir, rows, categories, years, seed):
+    os.makedirs(data_dir, exist_ok=True)
+    path = dataset_path(data_dir, rows, categories, years, seed)
+    if not os.path.exists(path):
+        print(f"synthesizing {os.path.basename(path)} ...", file=sys.stderr)
+        synthesize(path + ".tmp", rows, categories, years, seed)
+        os.replace(path + ".tmp", path)
+    return path
+
+# --- Timing ---
+def timed(fn, repeat):
+    """Run fn ``repeat`` times; return (last result, [seconds])."""
+    seconds, result = [], None
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        began = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - began)
+    return result, seconds
+
+def timing_record(dataset, stage, seconds, **extra):
+    return {
+        "dataset": dataset,
+        "stage": stage,
+        "unit": "s",
+        "value": statistics.median(seconds),
+        "min": min(seconds),
+        "max": max(seconds),
+        "repeat": len(seconds),
+        **extra,
+    }
+
+def run_pipeline(dataset, db_file, repeat, stages):
+    """Time every pipeline stage on one dataset; yields result records."""
+    def wanted(stage):
+        return any(fnmatch.fnmatch(stage, pattern) for pattern in stages)
+
+    conn = data_access.connect_to_db(db_file)
+    try:
+        df, seconds = timed(lambda: data_access.compact_frame(data_access.fetch_transactions_sql(conn)), repeat)
+        if wanted("fetch.transactions"):
+            yield timing_record(dataset, "fetch.transactions", seconds, rows=len(df),
+                                frame_bytes=int(df.memory_usage(deep=True).sum()))
+        if columnar.available() and (wanted("export.columnar") or wanted("fetch.transactions_columnar")):
+            state, seconds = timed(lambda: columnar.refresh(conn, full=True), 1)
+            if wanted("export.columnar"):
+                yield timing_record(dataset, "export.columnar", seconds, rows=state["rows"])
+            columnar_df, seconds = timed(lambda: data_access.fetch_data_from_db(conn), repeat)
+            if wanted("fetch.transactions_columnar"):
+                yield timing_record(dataset, "fetch.transactions_columnar", seconds, rows=len(columnar_df))
+            del columnar_df
+        daily, seconds = timed(lambda: data_access.fetch_daily_totals(conn), repeat)
+        if wanted("fetch.daily_totals"):
+            yield timing_record(dataset, "fetch.daily_totals", seconds, rows=len(daily))
+    finally:
+        conn.close()
+
+    prepares = {
+        "prepare.bar": lambda: bar_plot.prepare_data_for_plot(df),
+        "prepare.line": lambda: linechart.prepare_line_chart_data(df),
+        "prepare.heatmap": lambda: heatmap.prepare_data_for_plot(df),
+        "prepare.pie": lambda: pie_chart.prepare_pie_periods(df),
+        "prepare.daily_pivot": lambda: data_access.daily_pivot(daily),
+    }
+    pivot = None
+    for stage, fn in prepares.items():
+        if wanted(stage) or stage == "prepare.daily_pivot":
+            result, seconds = timed(fn, repeat)
+            if wanted(stage):
+                yield timing_record(dataset, stage, seconds)
+            if stage == "prepare.daily_pivot":
+                pivot = result
+    del df
+
+    # The figure builders get exactly what the render path hands them.
+    creates = {
+        "bar": lambda: bar_plot.create_bar_chart(pivot),
+        "line": lambda: linechart.create_chart(pivot),
+        "heatmap": lambda: heatmap.create_heatmap(*heatmap.bin_data_for_plot(daily)),
+        "pie": lambda: pie_chart.create_pie_chart(daily, lazy=True),
+    }
+    for chart, build in creates.items():
+        if not (wanted(f"create.{chart}") or wanted(f"serialize.{chart}")):
+            continue
+        fig, seconds = timed(build, repeat)
+        if wanted(f"create.{chart}"):
+            yield timing_record(dataset, f"create.{chart}", seconds, traces=len(fig.data))
+        if wanted(f"serialize.{chart}"):
+            html, seconds = timed(lambda: pio.to_html(fig, include_plotlyjs=plot_output.PLOTLY_JS_URL,
+                                                      full_html=True), repeat)
+            yield timing_record(dataset, f"serialize.{chart}", seconds, html_bytes=len(html))
+
+def run_load(dataset, db_file, modes, clients, seconds, workers, threads):
+    """Endpoint throughput and latency per serving mode (see bench_serving.py)."""
+    import shutil
+
+    import bench_serving
+
+    workdir, env, max_id = bench_serving.prepare_workdir(db_file)
+    try:
+        for mode in modes:
+            routes = bench_serving.run_mode(mode, env, max_id, clients, seconds, workers, threads)
+            for route, metrics in routes.items():
+                yield {
+                    "dataset": dataset,
+                    "stage": f"endpoint.{mode}.{route}",
+                    "unit": "p99_ms",
+                    "value": metrics.get("p99_ms"),
+                    "clients": clients,
+                    **metrics,
+                }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+# --- Metadata ---
+def run_metadata(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "plotly": plotly.__version__,
+        "args": {k: v for k, v in vars(args).items() if k not in ("compare",)},
+    }
+
+# --- Comparison ---
+def compare(baseline, current, threshold):
+    """Print per-stage ratios between two result files; return the regressions."""
+    def index(results):
+        return {(r["dataset"], r["stage"]): r for r in results["results"] if r.get("value") is not None}
+
+    old, new = index(baseline), index(current)
+    regressions = []
+    print(f"{'dataset':10s} {'stage':34s} {'before':>12s} {'after':>12s} {'ratio':>7s}")
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key]["value"], new[key]["value"]
+        ratio = after / before if before else float("inf")
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(f"{key[0]:10s} {key[1]:34s} {before:12.4f} {after:12.4f} {ratio:7.2f}{flag}")
+        if flag:
+            regressions.append(key)
+    return regressions
+
+# --- Main Execution ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the chart pipeline and the API.")
+    parser.add_argument("--rows", default="10k,100k,1m",
+                        help="comma-separated dataset sizes, e.g. 10k,1m,10m")
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage (median is reported)")
+    parser.add_argument("--stages", default="*",
+                        help="comma-separated glob patterns, e.g. 'fetch.*,create.bar'")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="where generated datasets are kept")
+    parser.add_argument("--load", action="store_true", help="also load-test the endpoints")
+    parser.add_argument("--load-mode", action="append", choices=("werkzeug", "asgi"))
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--load-seconds", type=float, default=15.0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="with --compare, flag stages slower than this ratio")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f1, open(args.compare[1], encoding="utf-8") as f2:
+            regressions = compare(json.load(f1), json.load(f2), args.threshold)
+        return 1 if regressions else 0
+
+    stages = [pattern.strip() for pattern in args.stages.split(",")]
+    output = {"meta": run_metadata(args), "results": []}
+    for size in args.rows.split(","):
+        rows = parse_count(size)
+        dataset = size.strip()
+        db_file = ensure_dataset(args.data_dir, rows, args.categories, args.years, args.seed)
+        records = list(run_pipeline(dataset, db_file, args.repeat, stages))
+        if args.load:
+            records += run_load(dataset, db_file, args.load_mode or ["asgi"], args.clients,
+                                args.load_seconds, args.workers, args.threads)
+        for record in records:
+            if record["unit"] == "s":
+                print(f"{dataset:6s} {record['stage']:34s} {record['value'] * 1000:10.1f} ms")
+            else:
+                print(f"{dataset:6s} {record['stage']:34s} {record['value']} {record['unit']}")
+        output["results"].extend(records)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(output, file, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
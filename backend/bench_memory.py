@@ -0,0 +1,149 @@
+"""Peak memory of the chart prepare step, whole-frame vs streamed.
+
+For every dataset size the bar, heatmap, line and pie prepare_* functions
+are run on the same data two ways, each in a fresh process:
+- frame: the whole transaction table read into one DataFrame, as
+  fetch_data_from_db does without a columnar snapshot.
+- stream: a data_access.TransactionStream, read in chunks and folded into
+  per-day/category totals under --memory-limit.
+
+The reported figure is the median peak RSS of --repeat runs, less a fixed
+baseline: the median peak of processes that only import, connect and run
+the same prepares over an empty date range (which pays for pandas' lazily
+loaded modules). Every measured run does that warm-up first too, so what
+remains is what the data itself costs.
+SQLite's memory map and page cache are turned down in the measured
+processes: they are bounded by SQLITE_MMAP_BYTES and SQLITE_CACHE_KIB
+(see storage.py) whatever the read does, and the map would otherwise count
+the pages of the database file it touched.
+The run exits with status 1 unless, for every dataset, the streamed figure
+stays under --memory-limit and within --tolerance of the smallest
+dataset's, i.e. flat as the row count grows. The running totals do grow
+with the number of distinct (day, category) pairs, so the smallest
+dataset should already cover most of them (100k rows over 5 years x 20
+categories does).
+
+    python bench_memory.py --rows 100k,1m,3m --memory-limit 64m
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+
+import bar_plot
+import data_access
+import heatmap
+import linechart
+import pie_chart
+import storage
+import units
+from bench import DEFAULT_DATA_DIR, ensure_dataset, parse_count
+
+MODES = ("frame", "stream")
+
+CHILD_ENV = {"SQLITE_MMAP_BYTES": "0", "SQLITE_CACHE_KIB": "2048"}
+
+def parse_bytes(text):
+    """'64m' -> 67108864."""
+    text = text.strip().lower()
+    scale = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}.get(text[-1:], 1)
+    return int(float(text.rstrip("kmg")) * scale)
+
+def peak_rss():
+    """Peak resident set size of this process so far, in bytes (Linux reports KiB)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+# --- Child Process ---
+def prepare_all(mode, conn, memory_limit, start_date=None):
+    if mode == "frame":
+        start_day = None if start_date is None else units.date_to_day(start_date)
+        data = data_access.compact_frame(data_access.fetch_transactions_sql(conn, start_day))
+    else:
+        data = data_access.TransactionStream(conn, start_date, memory_limit=memory_limit)
+    bar_plot.prepare_data_for_plot(data)
+    heatmap.prepare_data_for_plot(data)
+    linechart.prepare_line_chart_data(data)
+    pie_chart.prepare_pie_periods(data)
+
+def measure(mode, db_file, memory_limit, baseline=False):
+    """Peak RSS in bytes after a warm-up over an empty range and, unless baseline, the real prepares."""
+    conn = storage.connect(db_file)
+    try:
+        prepare_all(mode, conn, memory_limit, start_date="9999-01-01")
+        if not baseline:
+            prepare_all(mode, conn, memory_limit)
+    finally:
+        conn.close()
+    return peak_rss()
+
+def run_child(mode, db_file, memory_limit, repeat, baseline=False):
+    """Median peak RSS of ``repeat`` fresh processes running measure()."""
+    command = [sys.executable, __file__, "--child", mode, db_file, "--memory-limit", str(memory_limit)]
+    if baseline:
+        command.append("--baseline")
+    peaks = [
+        json.loads(subprocess.run(command, check=True, capture_output=True, text=True,
+                                  env=dict(os.environ, **CHILD_ENV)).stdout)
+        for _ in range(repeat)
+    ]
+    return statistics.median(peaks)
+
+# --- Main Execution ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare peak memory of whole-frame and streamed chart prepares.")
+    parser.add_argument("--rows", default="100k,1m", help="comma-separated dataset sizes, e.g. 100k,1m,3m")
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="where generated datasets are kept")
+    parser.add_argument("--memory-limit", default=str(data_access.DEFAULT_MEMORY_LIMIT),
+                        help="TransactionStream memory limit, e.g. 64m")
+    parser.add_argument("--tolerance", default="16m",
+                        help="largest allowed growth of the streamed peak across the datasets")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the median is kept")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "DB_FILE"), help=argparse.SUPPRESS)
+    parser.add_argument("--baseline", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    memory_limit = parse_bytes(args.memory_limit)
+    tolerance = parse_bytes(args.tolerance)
+
+    if args.child:
+        print(json.dumps(measure(args.child[0], args.child[1], memory_limit, args.baseline)))
+        return 0
+
+    sizes = [size.strip() for size in args.rows.split(",")]
+    db_files = [ensure_dataset(args.data_dir, parse_count(size), args.categories, args.years, args.seed)
+                for size in sizes]
+    # The same empty-range processes for every size, so the sizes are comparable.
+    baselines = {mode: run_child(mode, db_files[0], memory_limit, args.repeat, baseline=True)
+                 for mode in MODES}
+    print("baseline MiB: " + ", ".join(f"{mode} {baselines[mode] / 2 ** 20:.1f}" for mode in MODES))
+
+    peaks = {mode: [] for mode in MODES}
+    print(f"{'rows':>10s} {'frame MiB':>10s} {'stream MiB':>11s}")
+    for size, db_file in zip(sizes, db_files):
+        for mode in MODES:
+            peaks[mode].append(run_child(mode, db_file, memory_limit, args.repeat) - baselines[mode])
+        print(f"{size:>10s} {peaks['frame'][-1] / 2 ** 20:10.1f} {peaks['stream'][-1] / 2 ** 20:11.1f}")
+
+    failures = []
+    for size, peak in zip(sizes, peaks["stream"]):
+        if peak > memory_limit:
+            failures.append(f"{size}: streamed peak {peak / 2 ** 20:.1f} MiB is over the "
+                            f"{memory_limit / 2 ** 20:.0f} MiB memory limit")
+        growth = peak - peaks["stream"][0]
+        if growth > tolerance:
+            failures.append(f"{size}: streamed peak grew by {growth / 2 ** 20:.1f} MiB over {sizes[0]} "
+                            f"(tolerance {args.tolerance})")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures:
+        print(f"ok: streamed peak within {memory_limit / 2 ** 20:.0f} MiB and flat within {args.tolerance}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
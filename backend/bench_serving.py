@@ -0,0 +1,196 @@
+"""Throughput and tail latency of the API under concurrent clients.
+
+Starts the API in each serving mode against a scratch copy of a database
+and drives it with keep-alive client threads. The request mix is 70% paged
+GET /transactions, 10% POST /transactions and 20% GET /latest_plot/<type>.
+
+Modes:
+- ``werkzeug`` is the threaded development server that ``python app.py``
+  runs, without the debugger and reloader.
+- ``asgi`` is ``python asgi.py``: uvicorn with a2wsgi on a bounded thread pool.
+
+    python bench_serving.py database.sqlite --clients 32 --seconds 15
+"""
+import argparse
+import base64
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+PLOT_TYPES = ("bar", "heatmap", "line", "pie")
+CATEGORIES = ['Housing', 'Food', 'Transportation', 'Entertainment', 'Healthcare', 'Shopping', 'Others']
+
+# --- Servers ---
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def server_command(mode, port, workers, threads):
+    if mode == "werkzeug":
+        return [sys.executable, "-c",
+                f"from app import app; app.run(port={port}, threaded=True, debug=False)"]
+    return [sys.executable, "asgi.py", "--port", str(port),
+            "--workers", str(workers), "--threads", str(threads)]
+
+def wait_until_up(port, process, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/render_status")
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not come up")
+
+# --- Clients ---
+def request_mix(rng, max_id):
+    roll = rng.random()
+    if roll < 0.7:
+        after = rng.randrange(max_id)
+        # Cursors are opaque, but an id cursor is just [last_id] base64-encoded.
+        cursor = base64.urlsafe_b64encode(json.dumps([after]).encode()).decode()
+        return "transactions_get", "GET", f"/transactions?limit=50&cursor={cursor}", None, {}
+    if roll < 0.8:
+        body = json.dumps({
+            "description": "bench",
+            "amount": round(rng.uniform(1, 400), 2),
+            "category": rng.choice(CATEGORIES),
+            "date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        })
+        return "transactions_post", "POST", "/transactions", body, {"Content-Type": "application/json"}
+    plot_type = rng.choice(PLOT_TYPES)
+    return "latest_plot", "GET", f"/latest_plot/{plot_type}", None, {"Accept-Encoding": "gzip"}
+
+def client(port, seed, max_id, stop, samples):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    while not stop.is_set():
+        route, method, path, body, headers = request_mix(rng, max_id)
+        began = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            ok = response.status < 500
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            ok = False
+        samples.append((route, time.perf_counter() - began, ok))
+    conn.close()
+
+def _percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct))]
+
+def summarize(samples, seconds):
+    routes = {}
+    for route in sorted({s[0] for s in samples}) + [None]:
+        picked = [s for s in samples if route is None or s[0] == route]
+        latencies = sorted(s[1] for s in picked if s[2])
+        entry = {
+            "requests": len(picked),
+            "errors": sum(1 for s in picked if not s[2]),
+            "rps": round(len(latencies) / seconds, 1),
+        }
+        if latencies:
+            entry.update({
+                "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+                "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+                "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+            })
+        routes[route or "all"] = entry
+    return routes
+
+# --- Runs ---
+def prepare_workdir(source_db):
+    """Scratch database + plot directory with one published plot per type."""
+    workdir = tempfile.mkdtemp(prefix="bench-serving-")
+    db_file = os.path.join(workdir, "database.sqlite")
+    plot_dir = os.path.join(workdir, "plots")
+    src, dst = sqlite3.connect(source_db), sqlite3.connect(db_file)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+    env = dict(os.environ, DATABASE_FILE=db_file, PLOT_DIR=plot_dir)
+    # Importing app migrates the copy; then render every chart once.
+    subprocess.run([sys.executable, "-c",
+                    "import app, render_queue, os; "
+                    "render_queue.render_all(os.environ['DATABASE_FILE'], os.environ['PLOT_DIR'])"],
+                   cwd=BASE_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+    conn = sqlite3.connect(db_file)
+    max_id = conn.execute('SELECT MAX(id) FROM "transaction"').fetchone()[0] or 1
+    conn.close()
+    return workdir, env, max_id
+
+def run_mode(mode, env, max_id, clients, seconds, workers, threads):
+    port = _free_port()
+    # Renders are pushed out of the window so only request handling is measured.
+    env = dict(env, RENDER_DEBOUNCE_SECONDS="3600")
+    process = subprocess.Popen(server_command(mode, port, workers, threads), cwd=BASE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(port, process)
+        stop, samples = threading.Event(), []
+        pool = [threading.Thread(target=client, args=(port, i, max_id, stop, samples))
+                for i in range(clients)]
+        for thread in pool:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in pool:
+            thread.join()
+        return summarize(samples, seconds)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+# --- Main Execution ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("db_file", nargs="?", default="database.sqlite",
+                        help="database to copy for the run (left untouched)")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=15.0)
+    parser.add_argument("--workers", type=int, default=1, help="ASGI worker processes")
+    parser.add_argument("--threads", type=int, default=16, help="ASGI threads per worker")
+    parser.add_argument("--mode", choices=("werkzeug", "asgi"), action="append",
+                        help="run only this mode (repeatable)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    workdir, env, max_id = prepare_workdir(args.db_file)
+    try:
+        results = {"config": {k: v for k, v in vars(args).items() if k not in ("json", "mode")}}
+        for mode in args.mode or ("werkzeug", "asgi"):
+            results[mode] = run_mode(mode, env, max_id, args.clients, args.seconds,
+                                     args.workers, args.threads)
+            for route, entry in results[mode].items():
+                print(f"{mode:9s} {route:18s} {entry}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    return results
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""Mixed read/write throughput of the SQLite storage profile.
+
+Runs the same workload against two copies of a database: ``baseline``
+(rollback journal, default pragmas, no reporting indexes, a fresh
+connection per operation, the way the chart scripts used to connect) and
+``tuned`` (storage.py: WAL, tuned pragmas, indexes, pooled connections).
+
+    python bench_storage.py database.sqlite --seconds 10 --readers 4 --writers 1
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import migrations
+import rollup
+import storage
+import watermark
+
+CATEGORIES = ['Housing', 'Food', 'Transportation', 'Entertainment', 'Healthcare', 'Shopping', 'Others']
+
+# --- Profiles ---
+def prepare_baseline(db_file):
+    conn = sqlite3.connect(db_file)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    for name in storage.INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+    conn.close()
+
+    @contextmanager
+    def connection():
+        conn = sqlite3.connect(db_file, check_same_thread=False)
+        try:
+            yield conn
+        finally:
+            conn.close()
+    return connection
+
+def prepare_tuned(db_file):
+    conn = storage.connect(db_file)
+    storage.ensure_indexes(conn)
+    conn.commit()
+    conn.close()
+    pool = storage.ConnectionPool(db_file)
+    return pool.connection
+
+PROFILES = {"baseline": prepare_baseline, "tuned": prepare_tuned}
+
+# --- Workload ---
+def date_bounds(db_file):
+    conn = sqlite3.connect(db_file)
+    first, last = conn.execute('SELECT MIN(day), MAX(day) FROM "transaction"').fetchone()
+    conn.close()
+    return first, last
+
+def write_op(conn, rng, first, last):
+    """What POST /transactions does: row, rollup delta and watermark in one commit."""
+    day = rng.randint(first, last)
+    category = rng.choice(CATEGORIES)
+    amount_cents = rng.randrange(1000, 40000)
+    conn.execute(
+        'INSERT INTO "transaction" (description, amount_cents, category, day) VALUES (?, ?, ?, ?)',
+        ("bench", amount_cents, category, day),
+    )
+    rollup.apply_insert(conn, [(day, category, amount_cents)])
+    watermark.bump(conn)
+    conn.commit()
+
+def read_op(conn, rng, first, last):
+    """One of the reads the API and the reports issue, filtered by date and category."""
+    start = first + rng.randrange(max(last - first - 30, 1))
+    end = start + 30
+    kind = rng.randrange(3)
+    if kind == 0:
+        conn.execute(
+            'SELECT id, description, amount_cents, category, day FROM "transaction" '
+            'WHERE category = ? AND day >= ? AND day <= ? ORDER BY day LIMIT 100',
+            (rng.choice(CATEGORIES), start, end),
+        ).fetchall()
+    elif kind == 1:
+        conn.execute(
+            'SELECT category, SUM(amount_cents) FROM "transaction" '
+            'WHERE day >= ? AND day <= ? GROUP BY category',
+            (start, end),
+        ).fetchall()
+    else:
+        rollup.fetch_daily_totals(conn, start, end)
+
+def worker(op, connection, bounds, stop, seed, results):
+    rng = random.Random(seed)
+    latencies, errors = [], 0
+    while not stop.is_set():
+        began = time.perf_counter()
+        try:
+            with connection() as conn:
+                op(conn, rng, *bounds)
+        except sqlite3.OperationalError as exc:
+            if "locked" not in str(exc):  # only lock timeouts count as workload errors
+                raise
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - began)
+    results.append((latencies, errors))
+
+def _summary(results, seconds):
+    latencies = sorted(l for lats, _ in results for l in lats)
+    errors = sum(e for _, e in results)
+    if not latencies:
+        return {"ops": 0, "ops_per_sec": 0.0, "errors": errors}
+    return {
+        "ops": len(latencies),
+        "ops_per_sec": round(len(latencies) / seconds, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+        "errors": errors,
+    }
+
+def run_profile(name, source_db, seconds, readers, writers, seed):
+    workdir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    try:
+        db_file = os.path.join(workdir, "database.sqlite")
+        # The backup API also picks up anything still in the source's WAL file.
+        src, dst = sqlite3.connect(source_db), sqlite3.connect(db_file)
+        try:
+            src.backup(dst)
+            migrations.migrate(dst)
+            rollup.ensure_table(dst)
+            watermark.ensure_table(dst)
+            dst.commit()
+        finally:
+            src.close()
+            dst.close()
+        connection = PROFILES[name](db_file)
+        bounds = date_bounds(db_file)
+
+        stop = threading.Event()
+        read_results, write_results = [], []
+        threads = [
+            threading.Thread(target=worker, args=(read_op, connection, bounds, stop, seed + i, read_results))
+            for i in range(readers)
+        ] + [
+            threading.Thread(target=worker, args=(write_op, connection, bounds, stop, seed + 1000 + i, write_results))
+            for i in range(writers)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return {"reads": _summary(read_results, seconds), "writes": _summary(write_results, seconds)}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+# --- Main Execution ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("db_file", nargs="?", default="database.sqlite",
+                        help="database to copy for each profile (left untouched)")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=1)
+    parser.add_argument("--profile", choices=sorted(PROFILES), action="append",
+                        help="run only this profile (repeatable)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = {
+        "config": {"seconds": args.seconds, "readers": args.readers, "writers": args.writers},
+    }
+    for name in args.profile or list(PROFILES):
+        results[name] = run_profile(name, args.db_file, args.seconds, args.readers, args.writers, args.seed)
+        print(f"{name:9s} reads {results[name]['reads']}")
+        print(f"{'':9s} writes {results[name]['writes']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    return results
+
+if __name__ == "__main__":
+    main()
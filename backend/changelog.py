@@ -0,0 +1,129 @@
+import sqlite3
+from collections import namedtuple
+
+# Outbox of row-level changes to the transaction table. Triggers append one
+# row per inserted or deleted transaction inside the writing transaction,
+# so every write path (the API, bulk ingest, scripts) is covered and a
+# change is logged if and only if it commits.
+#
+# Consumers remember the last ``seq`` they applied next to their own state
+# and call catch_up() to fold in only what came after it, so keeping a
+# derived view current costs O(changes) rather than O(table). Changes are
+# delivered at least once, in seq order; a consumer makes replays harmless
+# by skipping seqs it has already applied.
+TABLE = "change_log"
+
+CREATE_SQL = f"""
+CREATE TABLE IF NOT EXISTS {TABLE} (
+    seq INTEGER NOT NULL PRIMARY KEY,
+    op TEXT NOT NULL CHECK (op IN ('insert', 'delete')),
+    transaction_id INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    category VARCHAR(50) NOT NULL,
+    amount_cents INTEGER NOT NULL
+)
+"""
+
+# An update is logged as the delete of the old row and the insert of the new one.
+TRIGGERS = {
+    "change_log_insert": f"""
+        CREATE TRIGGER IF NOT EXISTS change_log_insert AFTER INSERT ON "transaction"
+        BEGIN
+            INSERT INTO {TABLE} (op, transaction_id, day, category, amount_cents)
+            VALUES ('insert', NEW.id, NEW.day, NEW.category, NEW.amount_cents);
+        END
+    """,
+    "change_log_delete": f"""
+        CREATE TRIGGER IF NOT EXISTS change_log_delete AFTER DELETE ON "transaction"
+        BEGIN
+            INSERT INTO {TABLE} (op, transaction_id, day, category, amount_cents)
+            VALUES ('delete', OLD.id, OLD.day, OLD.category, OLD.amount_cents);
+        END
+    """,
+    "change_log_update": f"""
+        CREATE TRIGGER IF NOT EXISTS change_log_update
+        AFTER UPDATE OF id, day, category, amount_cents ON "transaction"
+        BEGIN
+            INSERT INTO {TABLE} (op, transaction_id, day, category, amount_cents)
+            VALUES ('delete', OLD.id, OLD.day, OLD.category, OLD.amount_cents),
+                   ('insert', NEW.id, NEW.day, NEW.category, NEW.amount_cents);
+        END
+    """,
+}
+
+COLUMNS = ("seq", "op", "transaction_id", "day", "category", "amount_cents")
+Change = namedtuple("Change", COLUMNS)
+
+DEFAULT_BATCH_SIZE = 10_000
+
+# prune() keeps at least this many of the newest changes. A consumer that
+# falls further behind than that has to rebuild its view from scratch.
+DEFAULT_RETENTION = 100_000
+
+def ensure_table(conn):
+    conn.execute(CREATE_SQL)
+    for sql in TRIGGERS.values():
+        conn.execute(sql)
+
+# --- Reads ---
+def last_seq(conn):
+    """Seq of the newest change, or 0 when nothing has been logged."""
+    try:
+        (seq,) = conn.execute(f"SELECT MAX(seq) FROM {TABLE}").fetchone()
+    except sqlite3.OperationalError:  # table not created yet
+        return 0
+    return seq or 0
+
+def read(conn, after_seq, limit=DEFAULT_BATCH_SIZE):
+    """Up to ``limit`` changes with seq > after_seq, oldest first."""
+    rows = conn.execute(f"""
+        SELECT {", ".join(COLUMNS)} FROM {TABLE}
+        WHERE seq > ? ORDER BY seq LIMIT ?
+    """, (after_seq, limit)).fetchall()
+    return [Change(*row) for row in rows]
+
+def covers(conn, after_seq):
+    """True when every change after after_seq is still in the log (none pruned)."""
+    if after_seq is None:
+        return False
+    try:
+        (first,) = conn.execute(f"SELECT MIN(seq) FROM {TABLE}").fetchone()
+    except sqlite3.OperationalError:
+        return False
+    # prune() always leaves the newest change, so an empty log means nothing
+    # has been logged yet.
+    return first is None or first <= after_seq + 1
+
+def has_deletes(conn, after_seq):
+    """Whether any row was deleted after after_seq; None when the log no longer covers it."""
+    if not covers(conn, after_seq):
+        return None
+    row = conn.execute(f"SELECT 1 FROM {TABLE} WHERE seq > ? AND op = 'delete' LIMIT 1",
+                       (after_seq,)).fetchone()
+    return row is not None
+
+def catch_up(conn, after_seq, apply, batch_size=DEFAULT_BATCH_SIZE):
+    """Feed every change after after_seq to apply(changes), batch by batch, in order.
+
+    Returns the last seq applied (after_seq if there was nothing new), or
+    None when changes after after_seq have been pruned and the consumer has
+    to rebuild instead. Run it inside a read transaction to stop at a
+    consistent point.
+    """
+    if not covers(conn, after_seq):
+        return None
+    while True:
+        changes = read(conn, after_seq, batch_size)
+        if not changes:
+            return after_seq
+        apply(changes)
+        after_seq = changes[-1].seq
+
+# --- Maintenance ---
+def prune(conn, retention=DEFAULT_RETENTION):
+    """Drop all but the newest ``retention`` changes (at least one is always kept); commits."""
+    cursor = conn.cursor()
+    cursor.execute(f"DELETE FROM {TABLE} WHERE seq <= (SELECT MAX(seq) FROM {TABLE}) - ?",
+                   (max(retention, 1),))
+    conn.commit()
+    return cursor.rowcount
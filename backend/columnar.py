@@ -0,0 +1,368 @@
+"""Columnar (Parquet) snapshot of the transaction table for analytics reads.
+
+    python columnar.py [database.sqlite] [--full]
+
+The snapshot lives next to the database in ``<database>.columnar/`` (or
+COLUMNAR_DIR) and is partitioned by month, hive style:
+
+    year=2024/month=03/part-<first id>-<last id>.parquet
+
+A refresh appends the rows above the recorded high-water-mark ``id``, so
+it costs O(new rows). Writing the state file commits it: parts above the
+mark are not read until then, and a refresh that died before it is
+cleaned up by the next one. A compacted file hides the parts it was built
+from until they are deleted. Deleted rows cannot be found that way; when the
+change log (see changelog.py) shows a delete since the last refresh, the
+snapshot is rebuilt in full. If the log has been pruned past that point,
+the row count below the mark decides instead.
+The refresh is opt-in: once a snapshot exists, the render scheduler keeps
+it fresh and data_access.fetch_data_from_db reads it (projected columns,
+pruned partitions, memory-mapped files) whenever it is at the current
+data watermark, falling back to SQL otherwise.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+except ImportError:  # optional; every read falls back to SQL without it
+    pa = None
+
+import changelog
+import metrics
+import storage
+import watermark
+
+STATE_FILE = "_state.json"
+STATE_FORMAT = 1
+
+EXPORT_BATCH_ROWS = 250_000
+# Incremental refreshes add a small file per touched month; past this many
+# a month is rewritten as one file.
+MAX_PARTS_PER_PARTITION = 16
+
+EXPORT_QUERY = 'SELECT id, description, amount_cents, category, day FROM "transaction"'
+
+def available():
+    return pa is not None
+
+def _schema():
+    return pa.schema([
+        ("id", pa.int64()),
+        ("description", pa.string()),
+        ("amount_cents", pa.int64()),
+        ("category", pa.dictionary(pa.int32(), pa.string())),
+        ("day", pa.int32()),
+    ])
+
+# --- Location and State ---
+def snapshot_dir_for(conn):
+    """Snapshot directory of the database conn is attached to."""
+    override = os.environ.get("COLUMNAR_DIR")
+    if override:
+        return override
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    return f"{path}.columnar" if path else None  # in-memory databases have none
+
+def read_state(snapshot_dir):
+    try:
+        with open(os.path.join(snapshot_dir, STATE_FILE), encoding="utf-8") as file:
+            state = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return state if state.get("format") == STATE_FORMAT else None
+
+def _write_state(snapshot_dir, state):
+    path = os.path.join(snapshot_dir, STATE_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(state, file)
+    os.replace(path + ".tmp", path)
+
+# --- Partitions ---
+def _month_keys(days):
+    """Epoch days -> year * 100 + month."""
+    months = days.astype("datetime64[D]").astype("datetime64[M]").astype("int64")
+    return (months // 12 + 1970) * 100 + months % 12 + 1
+
+def _partition_dir(snapshot_dir, key):
+    return os.path.join(snapshot_dir, f"year={key // 100}", f"month={key % 100:02d}")
+
+def _part_name(first_id, last_id):
+    return f"part-{first_id:012d}-{last_id:012d}.parquet"
+
+def _part_ids(path):
+    _, first, last = os.path.basename(path)[:-len(".parquet")].split("-")
+    return int(first), int(last)
+
+def _live_parts(files, high_water_id=None):
+    """The parts of one month a reader should see.
+
+    Parts above high_water_id were written by a refresh that has not
+    committed (or never will), and parts inside another file's id range
+    are the sources of a compaction that is not cleaned up yet.
+    """
+    spans = [(_part_ids(path), path) for path in files]
+    if high_water_id is not None:
+        spans = [(ids, path) for ids, path in spans if ids[0] <= high_water_id]
+    return [
+        path for (first, last), path in spans
+        if not any((other_first, other_last) != (first, last) and other_first <= first and last <= other_last
+                   for (other_first, other_last), _ in spans)
+    ]
+
+def list_partitions(snapshot_dir, high_water_id=None, live=True):
+    """{year * 100 + month: [parquet files]} currently in the snapshot.
+
+    Only the parts _live_parts() keeps, unless ``live`` is False.
+    """
+    partitions = {}
+    for year_dir in os.listdir(snapshot_dir):
+        if not year_dir.startswith("year="):
+            continue
+        for month_dir in os.listdir(os.path.join(snapshot_dir, year_dir)):
+            if not month_dir.startswith("month="):
+                continue
+            directory = os.path.join(snapshot_dir, year_dir, month_dir)
+            files = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                           if name.endswith(".parquet"))
+            if live:
+                files = _live_parts(files, high_water_id)
+            if files:
+                partitions[int(year_dir[5:]) * 100 + int(month_dir[6:])] = files
+    return partitions
+
+# --- Export ---
+class _PartitionWriters:
+    """One open Parquet writer per month touched by an export, committed together."""
+
+    def __init__(self, snapshot_dir):
+        self.snapshot_dir = snapshot_dir
+        self.schema = _schema()
+        self._writers = {}
+        self._ids = {}
+
+    def write(self, df):
+        keys = _month_keys(df["day"].to_numpy())
+        for key in np.unique(keys):
+            part = df[keys == key]
+            if key not in self._writers:
+                directory = _partition_dir(self.snapshot_dir, int(key))
+                os.makedirs(directory, exist_ok=True)
+                tmp_path = os.path.join(directory, f".{uuid.uuid4().hex}.tmp")
+                self._writers[key] = (pq.ParquetWriter(tmp_path, self.schema), tmp_path)
+                self._ids[key] = [int(part["id"].iloc[0]), 0]
+            self._ids[key][1] = int(part["id"].iloc[-1])
+            writer = self._writers[key][0]
+            writer.write_table(pa.Table.from_pandas(part, schema=self.schema, preserve_index=False))
+        return set(int(key) for key in np.unique(keys))
+
+    def commit(self):
+        """Close every writer and move its file into place."""
+        for key, (writer, tmp_path) in self._writers.items():
+            writer.close()
+            first, last = self._ids[key]
+            os.replace(tmp_path, os.path.join(os.path.dirname(tmp_path), _part_name(first, last)))
+        self._writers.clear()
+
+    def abort(self):
+        for writer, tmp_path in self._writers.values():
+            writer.close()
+            os.unlink(tmp_path)
+        self._writers.clear()
+
+def _export(conn, snapshot_dir, after_id):
+    """Write rows with id > after_id; returns (rows written, last id, months touched)."""
+    writers = _PartitionWriters(snapshot_dir)
+    rows, last_id, touched = 0, after_id, set()
+    try:
+        for df in pd.read_sql_query(f"{EXPORT_QUERY} WHERE id > ? ORDER BY id", conn,
+                                    params=(after_id,), chunksize=EXPORT_BATCH_ROWS):
+            if df.empty:
+                continue
+            touched |= writers.write(df)
+            rows += len(df)
+            last_id = int(df["id"].iloc[-1])
+        writers.commit()
+    except BaseException:
+        writers.abort()
+        raise
+    return rows, last_id, touched
+
+def _drop_dead_parts(snapshot_dir, high_water_id):
+    """Delete parts no reader sees: uncommitted ones and already compacted ones."""
+    live = list_partitions(snapshot_dir, high_water_id)
+    for key, files in list_partitions(snapshot_dir, live=False).items():
+        for path in set(files) - set(live.get(key, [])):
+            os.unlink(path)
+
+def _compact(snapshot_dir, keys, high_water_id):
+    """Rewrite each month in keys that has grown too many files as a single file.
+
+    The new file covers the id range of the parts it replaces, so readers
+    skip those parts from the moment it appears.
+    """
+    partitions = list_partitions(snapshot_dir, high_water_id)
+    for key in keys:
+        files = partitions.get(key, [])
+        if len(files) <= MAX_PARTS_PER_PARTITION:
+            continue
+        directory = os.path.dirname(files[0])
+        tmp_path = os.path.join(directory, f".{uuid.uuid4().hex}.tmp")
+        pq.write_table(pq.read_table(files, schema=_schema()), tmp_path)
+        target = os.path.join(directory, _part_name(_part_ids(files[0])[0], _part_ids(files[-1])[1]))
+        os.replace(tmp_path, target)
+        for path in files:
+            if path != target:
+                os.unlink(path)
+
+@metrics.timed("export", dataset="columnar")
+def refresh(conn, snapshot_dir=None, full=False):
+    """Bring the snapshot up to the database; returns the new state.
+
+    Reads run inside one read transaction, so the rows, the row count and
+    the recorded data version all come from the same database snapshot.
+    """
+    if pa is None:
+        raise RuntimeError("The columnar snapshot needs pyarrow: pip install pyarrow")
+    snapshot_dir = snapshot_dir or snapshot_dir_for(conn)
+    state = None if full else read_state(snapshot_dir)
+
+    began_here = not conn.in_transaction
+    if began_here:
+        conn.execute("BEGIN")
+    try:
+        version = watermark.read(conn)
+        change_seq = changelog.last_seq(conn)
+        if state is not None:
+            if state["data_version"] == version:
+                return state
+            deleted = changelog.has_deletes(conn, state.get("change_seq"))
+            if deleted is None:
+                (below,) = conn.execute('SELECT COUNT(*) FROM "transaction" WHERE id <= ?',
+                                        (state["high_water_id"],)).fetchone()
+                deleted = below != state["rows"]
+            if deleted:
+                state = None  # rows were deleted below the mark
+
+        if state is None:
+            parent = os.path.dirname(os.path.abspath(snapshot_dir))
+            build_dir = tempfile.mkdtemp(prefix=".columnar-", dir=parent)
+            try:
+                rows, last_id, _ = _export(conn, build_dir, 0)
+                state = {"format": STATE_FORMAT, "high_water_id": last_id, "rows": rows,
+                         "data_version": version, "change_seq": change_seq}
+                _write_state(build_dir, state)
+            except BaseException:
+                shutil.rmtree(build_dir, ignore_errors=True)
+                raise
+            # Swap the finished build in; readers racing the swap fall back to SQL.
+            old_dir = f"{build_dir}.old"
+            if os.path.exists(snapshot_dir):
+                os.replace(snapshot_dir, old_dir)
+            os.replace(build_dir, snapshot_dir)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        else:
+            _drop_dead_parts(snapshot_dir, state["high_water_id"])
+            rows, last_id, touched = _export(conn, snapshot_dir, state["high_water_id"])
+            state = dict(state, high_water_id=last_id, rows=state["rows"] + rows,
+                         data_version=version, change_seq=change_seq)
+            _write_state(snapshot_dir, state)
+            _compact(snapshot_dir, touched, last_id)
+    finally:
+        if began_here:
+            conn.rollback()
+    metrics.add_rows("export", state["rows"], dataset="columnar")
+    return state
+
+def refresh_if_present(conn):
+    """refresh() a snapshot that has been created before; otherwise do nothing."""
+    snapshot_dir = snapshot_dir_for(conn) if pa is not None else None
+    if snapshot_dir and read_state(snapshot_dir) is not None:
+        return refresh(conn, snapshot_dir)
+    return None
+
+# --- Reads ---
+def read_table(snapshot_dir, columns=("amount_cents", "category", "day"),
+               start_day=None, end_day=None, categories=None, high_water_id=None):
+    """Read the snapshot as an Arrow table.
+
+    Only the requested columns are decoded, months outside
+    [start_day, end_day] are never opened, and files are memory-mapped.
+    ``high_water_id`` (from the state) keeps out rows a later refresh
+    added while this read was starting.
+    """
+    low = None if start_day is None else int(_month_keys(np.array([start_day]))[0])
+    high = None if end_day is None else int(_month_keys(np.array([end_day]))[0])
+    files = [
+        path
+        for key, paths in sorted(list_partitions(snapshot_dir, high_water_id).items())
+        if (low is None or key >= low) and (high is None or key <= high)
+        for path in paths
+    ]
+    if not files:
+        return _schema().empty_table().select(list(columns))
+
+    conditions = []
+    if high_water_id is not None:
+        conditions.append(ds.field("id") <= high_water_id)
+    if start_day is not None:
+        conditions.append(ds.field("day") >= start_day)
+    if end_day is not None:
+        conditions.append(ds.field("day") <= end_day)
+    if categories:
+        conditions.append(ds.field("category").isin(list(categories)))
+    condition = None
+    for expression in conditions:
+        condition = expression if condition is None else condition & expression
+
+    dataset = ds.dataset(files, schema=_schema(), format="parquet",
+                         filesystem=pafs.LocalFileSystem(use_mmap=True))
+    return dataset.to_table(columns=list(columns), filter=condition)
+
+def read_frame_if_current(conn, columns=("amount_cents", "category", "day"),
+                          start_day=None, end_day=None, categories=None):
+    """Snapshot rows as a pandas frame, or None when there is no current snapshot."""
+    if pa is None:
+        return None
+    snapshot_dir = snapshot_dir_for(conn)
+    state = read_state(snapshot_dir) if snapshot_dir else None
+    if state is None or state["data_version"] != watermark.read(conn):
+        return None
+    try:
+        table = read_table(snapshot_dir, columns, start_day, end_day, categories, state["high_water_id"])
+    except (OSError, pa.ArrowException):  # a rebuild swapped the files out mid-read
+        return None
+    metrics.add_rows("fetch", table.num_rows, dataset="columnar")
+    return table.to_pandas()
+
+# --- Main Execution ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the transaction table to a Parquet snapshot.")
+    parser.add_argument("db_file", nargs="?", default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "database.sqlite"))
+    parser.add_argument("--full", action="store_true", help="rebuild instead of appending new rows")
+    args = parser.parse_args(argv)
+    if pa is None:
+        sys.exit("The columnar snapshot needs pyarrow: pip install pyarrow")
+
+    conn = storage.connect(args.db_file)
+    try:
+        state = refresh(conn, full=args.full)
+        print(f"{snapshot_dir_for(conn)}: {state['rows']} rows up to id {state['high_water_id']} "
+              f"(data version {state['data_version']})")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,239 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
 import dash
-from dash import dcc, html
-import plotly.graph_objs as go
-import pandas as pd
-import sqlite3
+import plotly.utils
+from dash import dcc, html, Input, Output, State, Patch, no_update
+from dash.exceptions import PreventUpdate
+
+import rollup
+import storage
+import units
+from data_access import DB_FILE, RenderCycle, fetch_watermark
+from figure_cache import default_cache
 
 # Import your existing functions for each plot
 from bar_plot import create_bar_chart
-from pie_chart import create_pie_chart
-from heatmap import create_heatmap
+from pie_chart import create_range_pie_chart
+import heatmap
 from linechart import create_chart
 
-# --- Initialize Dash ---
-app = dash.Dash(__name__)
+REFRESH_SECONDS = float(os.environ.get("DASHBOARD_REFRESH_SECONDS", 5))
 
-# --- Database Connection & Data Fetching ---
-def fetch_data():
-    conn = sqlite3.connect("database.sqlite")
-    df = pd.read_sql_query("SELECT amount, category, date FROM 'transaction'", conn)
-    conn.close()
-    return df
+GRAPH_IDS = ("bar-chart", "pie-chart", "heatmap", "line-chart")
 
-df = fetch_data()
+# --- Initialize Dash ---
+app = dash.Dash(__name__)
 
 # --- Layout for Dashboard ---
+# Figures start empty and are filled by the callbacks below, so the data is
+# read per request (and per data version) rather than frozen at import time.
 app.layout = html.Div([
     html.H1("Finance Dashboard", style={'textAlign': 'center'}),
-    
-    dcc.Graph(id="bar-chart", figure=create_bar_chart(df)),
-    dcc.Graph(id="pie-chart", figure=create_pie_chart(df)),
-    dcc.Graph(id="heatmap", figure=create_heatmap(df)),
-    dcc.Graph(id="line-chart", figure=create_chart(df)),
+
+    html.Div([
+        dcc.DatePickerRange(id="date-range", display_format="YYYY-MM-DD"),
+        dcc.Dropdown(id="category-filter", multi=True, placeholder="All categories",
+                     style={'minWidth': '320px'}),
+    ], style={'display': 'flex', 'gap': '16px', 'justifyContent': 'center'}),
+
+    *[dcc.Graph(id=graph_id) for graph_id in GRAPH_IDS],
+
+    # Polls the cheap one-row watermark; figures are only rebuilt when it moves.
+    dcc.Interval(id="refresh", interval=int(REFRESH_SECONDS * 1000)),
+    dcc.Store(id="data-version"),
+    # Per-graph trace hashes of what the browser currently shows.
+    dcc.Store(id="figure-signatures", data={}),
 ])
 
+# --- Data Version ---
+@app.callback(
+    Output("data-version", "data"),
+    Input("refresh", "n_intervals"),
+    State("data-version", "data"),
+)
+def poll_data_version(_, current_version):
+    with storage.get_pool(DB_FILE).connection() as conn:
+        version = fetch_watermark(conn)
+    if version == current_version:
+        raise PreventUpdate
+    return version
+
+@app.callback(
+    Output("date-range", "min_date_allowed"),
+    Output("date-range", "max_date_allowed"),
+    Output("category-filter", "options"),
+    Input("data-version", "data"),
+)
+def update_controls(_):
+    with storage.get_pool(DB_FILE).connection() as conn:
+        first_day, last_day, categories = rollup.fetch_bounds(conn)
+    if first_day is None:
+        return None, None, categories
+    return units.day_to_date(first_day), units.day_to_date(last_day), categories
+
+# --- Figures ---
+def build_figures(start_date, end_date, categories):
+    """Build (or fetch from the figure cache) all four figures for one filter set.
+
+    The rollup is only queried on a cache miss, with the filters applied in
+    SQL, and every viewer asking for the same filters at the same data
+    version shares one set of figures.
+    """
+    params = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "categories": sorted(categories or []),
+    }
+    with RenderCycle(DB_FILE, **params) as cycle:
+        version = cycle.watermark()
+        label = f"{start_date or 'start'} to {end_date or 'latest'}"
+        builders = {
+            "bar-chart": lambda: create_bar_chart(cycle.daily_pivot()),
+            "pie-chart": lambda: create_range_pie_chart(cycle.daily_totals(), label),
+            "heatmap": lambda: heatmap.create_heatmap(*heatmap.bin_data_for_plot(cycle.daily_totals())),
+            "line-chart": lambda: create_chart(cycle.daily_pivot()),
+        }
+        # The heatmap's bins also depend on its category and cell limits.
+        graph_params = {
+            "heatmap": {"top_n": heatmap.DEFAULT_TOP_CATEGORIES, "cells": heatmap.DEFAULT_CELL_BUDGET, **params},
+        }
+        figures = {
+            graph_id: default_cache.get_or_build(
+                f"dashboard:{graph_id}", graph_params.get(graph_id, params), version, build)
+            for graph_id, build in builders.items()
+        }
+    return figures, json.dumps(params, sort_keys=True), version
+
+def _digest(obj):
+    encoded = json.dumps(obj, sort_keys=True, cls=plotly.utils.PlotlyJSONEncoder)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+_signatures = OrderedDict()
+_signatures_lock = threading.Lock()
+
+def figure_signature(key, fig):
+    """Layout and per-trace hashes of fig, computed once per (graph, filters, version)."""
+    with _signatures_lock:
+        if key in _signatures:
+            _signatures.move_to_end(key)
+            return _signatures[key]
+    signature = {
+        "layout": _digest(fig.layout.to_plotly_json()),
+        "traces": [_digest(trace.to_plotly_json()) for trace in fig.data],
+    }
+    with _signatures_lock:
+        _signatures[key] = signature
+        while len(_signatures) > default_cache.max_entries:
+            _signatures.popitem(last=False)
+    return signature
+
+def figure_update(fig, old_signature, new_signature):
+    """Smallest update that turns the browser's figure into fig.
+
+    Only traces whose content changed are sent as a Patch; a changed layout
+    or trace count falls back to the full figure.
+    """
+    if (not old_signature
+            or old_signature["layout"] != new_signature["layout"]
+            or len(old_signature["traces"]) != len(new_signature["traces"])):
+        return fig
+
+    changed = [
+        i for i, (old, new) in enumerate(zip(old_signature["traces"], new_signature["traces"]))
+        if old != new
+    ]
+    if not changed:
+        return no_update
+
+    patch = Patch()
+    for i in changed:
+        patch["data"][i] = fig.data[i].to_plotly_json()
+    return patch
+
+@app.callback(
+    [Output(graph_id, "figure") for graph_id in GRAPH_IDS],
+    Output("figure-signatures", "data"),
+    Input("data-version", "data"),
+    Input("date-range", "start_date"),
+    Input("date-range", "end_date"),
+    Input("category-filter", "value"),
+    State("figure-signatures", "data"),
+)
+def update_figures(_, start_date, end_date, categories, signatures):
+    figures, params_key, version = build_figures(start_date, end_date, categories)
+    signatures = signatures or {}
+
+    updates, new_signatures = [], {}
+    for graph_id in GRAPH_IDS:
+        new_signatures[graph_id] = figure_signature((graph_id, params_key, version), figures[graph_id])
+        updates.append(figure_update(figures[graph_id], signatures.get(graph_id), new_signatures[graph_id]))
+    return *updates, new_signatures
+
+# --- Zoom ---
+# Zooming the bar or line chart swaps in a figure built for just the visible
+# window, at the finer resolution that window affords.
+ZOOMABLE = {
+    "bar-chart": create_bar_chart,
+    "line-chart": create_chart,
+}
+
+def zoom_window(relayout_data):
+    """(start, end) dates of a zoomed x axis, () for a reset, None for anything else."""
+    relayout_data = relayout_data or {}
+    if relayout_data.get("xaxis.autorange"):
+        return ()
+    if "xaxis.range[0]" in relayout_data:
+        start, end = relayout_data["xaxis.range[0]"], relayout_data["xaxis.range[1]"]
+    elif "xaxis.range" in relayout_data:
+        start, end = relayout_data["xaxis.range"]
+    else:
+        return None
+    return str(start)[:10], str(end)[:10]
+
+def build_zoomed_figure(graph_id, window, start_date, end_date, categories):
+    # The zoom window is narrowed to the filter range, never widened past it.
+    params = {
+        "start_date": max(filter(None, (window[0], start_date))),
+        "end_date": min(filter(None, (window[1], end_date))),
+        "categories": sorted(categories or []),
+    }
+    with RenderCycle(DB_FILE, **params) as cycle:
+        return default_cache.get_or_build(
+            f"dashboard:{graph_id}:zoom", params, cycle.watermark(),
+            lambda: ZOOMABLE[graph_id](cycle.daily_pivot()),
+        )
+
+def _zoom_callback(graph_id):
+    @app.callback(
+        Output(graph_id, "figure", allow_duplicate=True),
+        Output("figure-signatures", "data", allow_duplicate=True),
+        Input(graph_id, "relayoutData"),
+        State("date-range", "start_date"),
+        State("date-range", "end_date"),
+        State("category-filter", "value"),
+        State("figure-signatures", "data"),
+        prevent_initial_call=True,
+    )
+    def zoom(relayout_data, start_date, end_date, categories, signatures):
+        window = zoom_window(relayout_data)
+        if window is None:
+            raise PreventUpdate
+        if window:
+            fig = build_zoomed_figure(graph_id, window, start_date, end_date, categories)
+        else:
+            fig = build_figures(start_date, end_date, categories)[0][graph_id]
+        # The browser no longer shows the filter-range figure, so the next
+        # data refresh must send this graph in full rather than as a Patch.
+        signatures = dict(signatures or {}, **{graph_id: None})
+        return fig, signatures
+    return zoom
+
+for _graph_id in ZOOMABLE:
+    _zoom_callback(_graph_id)
+
 if __name__ == "__main__":
-    app.run_server(debug=True, host="0.0.0.0", port=8050)
+    app.run(debug=True, host="0.0.0.0", port=8050)
@@ -0,0 +1,262 @@
+import os
+import threading
+
+import pandas as pd
+
+import columnar
+import metrics
+import rollup
+import storage
+import units
+import watermark
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DB_FILE = os.environ.get("DATABASE_FILE") or os.path.join(BASE_DIR, "database.sqlite")
+
+TRANSACTIONS_QUERY = 'SELECT amount_cents, category, day FROM "transaction"'
+
+# Ceiling on what a TransactionStream may hold at once, in bytes: one
+# chunk being read plus the running per-day/category totals.
+DEFAULT_MEMORY_LIMIT = int(os.environ.get("PREPARE_MEMORY_LIMIT", 128 * 1024 * 1024))
+
+# Rough peak bytes per row while read_sql_query builds a chunk (the fetched
+# tuples and the frame made from them), used to size chunks to the limit.
+# Measured with bench_memory.py; the interpreter's fixed overhead is not
+# part of the limit.
+CHUNK_ROW_BYTES = 600
+
+# --- Database Connection ---
+def connect_to_db(db_file=DB_FILE):
+    """Connect to the SQLite database (WAL and tuned pragmas, see storage.py)."""
+    return storage.connect(db_file)
+
+# --- Compact Frames ---
+def compact_frame(df, amount_dtype="float32"):
+    """Turn an (amount_cents, category, day) storage frame into the chart frame.
+
+    The result has ``amount`` in currency units as ``amount_dtype``,
+    ``category`` as a Categorical (one small code per row instead of a
+    Python string) and ``date`` as datetime64[ns]. Epoch days map straight
+    onto datetime64[D], so no date string is ever parsed.
+    """
+    return pd.DataFrame({
+        "amount": (df["amount_cents"].to_numpy() / 100).astype(amount_dtype),
+        "category": df["category"].astype("category"),
+        "date": df["day"].to_numpy(dtype="int64").astype("datetime64[D]").astype("datetime64[ns]"),
+    })
+
+# --- Fetch Data from Database ---
+def fetch_data_from_db(conn, start_date=None, end_date=None, categories=None):
+    """Fetch transactions as a compact (amount, category, date) frame.
+
+    Reads the columnar snapshot when one is current (see columnar.py) and
+    the transaction table otherwise. ``start_date``/``end_date`` are
+    inclusive ISO dates.
+    """
+    start_day = None if start_date is None else units.date_to_day(start_date)
+    end_day = None if end_date is None else units.date_to_day(end_date)
+    with metrics.span("fetch", dataset="transactions"):
+        df = columnar.read_frame_if_current(conn, start_day=start_day, end_day=end_day,
+                                            categories=categories)
+        if df is None:
+            df = fetch_transactions_sql(conn, start_day, end_day, categories)
+        df = compact_frame(df)
+    metrics.add_rows("fetch", len(df), dataset="transactions")
+    return df
+
+def fetch_transactions_sql(conn, start_day=None, end_day=None, categories=None):
+    """(amount_cents, category, day) rows straight from the transaction table."""
+    where, params = _transactions_where(start_day, end_day, categories)
+    return pd.read_sql_query(f"{TRANSACTIONS_QUERY} {where}", conn, params=params)
+
+def _transactions_where(start_day, end_day, categories):
+    clauses, params = [], []
+    if start_day is not None:
+        clauses.append("day >= ?")
+        params.append(start_day)
+    if end_day is not None:
+        clauses.append("day <= ?")
+        params.append(end_day)
+    if categories:
+        clauses.append(f"category IN ({', '.join('?' for _ in categories)})")
+        params.extend(categories)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+# --- Streaming Aggregation ---
+class TransactionStream:
+    """The transaction table read in bounded chunks instead of one frame.
+
+    The prepare_* functions of the chart modules accept one in place of a
+    transaction frame. Each chunk is reduced to per-day, per-category
+    sums and folded into running totals, so memory follows the number of
+    (day, category) pairs rather than the number of rows. Chunks are sized
+    so that one of them takes at most a quarter of ``memory_limit``;
+    running totals beyond half of it raise MemoryError. The totals are
+    kept after the first pass, so several charts prepared from one stream
+    read the table once.
+    """
+
+    def __init__(self, conn, start_date=None, end_date=None, categories=None,
+                 memory_limit=DEFAULT_MEMORY_LIMIT):
+        self.conn = conn
+        self.start_day = None if start_date is None else units.date_to_day(start_date)
+        self.end_day = None if end_date is None else units.date_to_day(end_date)
+        self.categories = categories
+        self.memory_limit = memory_limit
+        self.chunksize = max(memory_limit // 4 // CHUNK_ROW_BYTES, 1000)
+        self._daily = None
+
+    def chunks(self):
+        """Raw (amount_cents, category, day) frames of at most chunksize rows."""
+        where, params = _transactions_where(self.start_day, self.end_day, self.categories)
+        return pd.read_sql_query(f"{TRANSACTIONS_QUERY} {where}", self.conn, params=params,
+                                 chunksize=self.chunksize)
+
+    def daily_totals(self):
+        """Daily totals frame shaped like fetch_daily_totals(), folded on first use."""
+        if self._daily is None:
+            self._daily = self._fold_chunks()
+        return self._daily
+
+    @metrics.timed("fetch", dataset="transaction_stream")
+    def _fold_chunks(self):
+        totals, pending, pending_rows, rows = None, [], 0, 0
+        for chunk in self.chunks():
+            rows += len(chunk)
+            pending.append(chunk.groupby(["day", "category"], sort=False)["amount_cents"].sum())
+            pending_rows += len(pending[-1])
+            # Fold once the partial sums outgrow the totals, so each pair is
+            # re-summed a bounded number of times.
+            if totals is None or pending_rows >= len(totals):
+                totals = _fold(totals, pending)
+                pending, pending_rows = [], 0
+                if totals.memory_usage(deep=True) > self.memory_limit // 2:
+                    raise MemoryError(
+                        f"daily totals outgrew half the {self.memory_limit}-byte memory limit "
+                        f"({len(totals)} day/category pairs)"
+                    )
+        totals = _fold(totals, pending)
+        metrics.add_rows("fetch", rows, dataset="transaction_stream")
+        daily = totals.rename("amount_cents").reset_index() if totals is not None else pd.DataFrame(
+            {"amount_cents": pd.Series(dtype="int64"), "category": pd.Series(dtype=object),
+             "day": pd.Series(dtype="int64")})
+        return compact_frame(daily.sort_values("day", kind="stable"), amount_dtype="float64")
+
+def _fold(totals, parts):
+    parts = ([] if totals is None else [totals]) + parts
+    if not parts:
+        return totals
+    return pd.concat(parts).groupby(level=["day", "category"], sort=False).sum()
+
+def as_chart_frame(data):
+    """A transaction frame as is, or a TransactionStream folded into daily totals.
+
+    Every chart aggregates by summing, so the daily totals give the same
+    result as the rows they came from.
+    """
+    if isinstance(data, TransactionStream):
+        return data.daily_totals()
+    return data
+
+def fetch_daily_totals(conn, start_date=None, end_date=None, categories=None):
+    """Fetch the daily x category rollup as a compact frame, optionally filtered.
+
+    ``start_date``/``end_date`` are inclusive ISO dates. Totals keep
+    float64: they are already aggregated, so the frame is small and
+    narrowing would only cost precision.
+    """
+    with metrics.span("fetch", dataset="daily_totals"):
+        df = rollup.fetch_daily_totals(
+            conn,
+            None if start_date is None else units.date_to_day(start_date),
+            None if end_date is None else units.date_to_day(end_date),
+            categories,
+        )
+        df = compact_frame(df, amount_dtype="float64")
+    metrics.add_rows("fetch", len(df), dataset="daily_totals")
+    return df
+
+def fetch_watermark(conn):
+    """Current data version (see watermark.py)."""
+    return watermark.read(conn)
+
+# --- Render Cycle ---
+class RenderCycle:
+    """One consistent read of the data, shared by every chart in a render.
+
+    Each dataset is loaded at most once per cycle, on one pooled connection
+    inside one read transaction (so the watermark and every frame come from
+    the same snapshot), and every consumer gets the same frame object back.
+    Consumers must treat the frames as read-only; they are shared, not
+    copied.
+
+    ``filters`` (start_date, end_date, categories) narrow the daily totals
+    in SQL, for views of part of the history.
+    """
+
+    def __init__(self, db_file=DB_FILE, **filters):
+        self.db_file = db_file
+        self.filters = filters
+        self._conn = None
+        self._frames = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_frames(cls, frames, db_file=DB_FILE, **filters):
+        """A cycle preloaded with frames read elsewhere (e.g. in another process)."""
+        cycle = cls(db_file, **filters)
+        cycle._frames.update(frames)
+        return cycle
+
+    def frames(self, *keys):
+        """Load and return {key: frame} for the named datasets."""
+        loaders = {"watermark": self.watermark, "transactions": self.transactions,
+                   "daily_totals": self.daily_totals, "daily_pivot": self.daily_pivot}
+        return {key: loaders[key]() for key in keys}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                storage.get_pool(self.db_file).release(self._conn)
+                self._conn = None
+            self._frames.clear()
+
+    def _load(self, key, loader):
+        with self._lock:
+            if key not in self._frames:
+                if self._conn is None:
+                    self._conn = storage.get_pool(self.db_file).acquire()
+                    # Held until close(); the pool rolls it back on release.
+                    self._conn.execute("BEGIN")
+                self._frames[key] = loader(self._conn)
+            return self._frames[key]
+
+    def watermark(self):
+        """Data version the cycle's frames were read at."""
+        return self._load("watermark", fetch_watermark)
+
+    def transactions(self):
+        """Every transaction, as returned by fetch_data_from_db."""
+        return self._load("transactions", fetch_data_from_db)
+
+    def daily_totals(self):
+        """Per-day, per-category totals from the rollup table."""
+        return self._load("daily_totals", lambda conn: fetch_daily_totals(conn, **self.filters))
+
+    def daily_pivot(self):
+        """Date x category pivot of the daily totals, as the charts expect."""
+        return self._load("daily_pivot", lambda conn: daily_pivot(self.daily_totals()))
+
+@metrics.timed("prepare", chart="daily_pivot")
+def daily_pivot(daily_totals):
+    """Pivot a daily totals frame; (date, category) is unique so no aggregation runs."""
+    df_pivot = daily_totals.pivot(index="date", columns="category", values="amount").fillna(0)
+    df_pivot.columns = df_pivot.columns.astype(str)
+    return df_pivot
@@ -0,0 +1,214 @@
+import numpy as np
+import pandas as pd
+
+# Default number of points (bars per category, or line vertices per trace)
+# a figure may carry, however long the history is.
+DEFAULT_POINT_BUDGET = 1000
+
+# The line chart picks the finest bucket with at most this many times the
+# budget (or the coarsest there is), then lets LTTB thin it down to the
+# budget, which keeps peaks a coarser bucket would average away.
+LTTB_OVERSAMPLE = 4
+
+# name -> pandas period frequency, from finest to coarsest. Buckets are
+# labelled by their first day; weeks run Monday to Sunday.
+RESOLUTIONS = {
+    "day": "D",
+    "week": "W-SUN",
+    "month": "M",
+    "quarter": "Q",
+    "year": "Y",
+}
+
+# Titles name the bucket size whenever the chart is not showing single days.
+RESOLUTION_LABELS = {
+    "week": "weekly totals",
+    "month": "monthly totals",
+    "quarter": "quarterly totals",
+    "year": "yearly totals",
+}
+
+# --- Resolution Selection ---
+def bucket_count(start, end, resolution):
+    """Number of buckets the inclusive [start, end] range touches."""
+    start = pd.Period(start, freq=RESOLUTIONS[resolution])
+    end = pd.Period(end, freq=RESOLUTIONS[resolution])
+    return end.ordinal - start.ordinal + 1
+
+def choose_resolution(start, end, point_budget=DEFAULT_POINT_BUDGET):
+    """Finest resolution whose bucket count over [start, end] fits the budget.
+
+    Falls back to the coarsest resolution when none fits, so callers that
+    must stay within the budget thin that one further.
+    """
+    for resolution in RESOLUTIONS:
+        if bucket_count(start, end, resolution) <= point_budget:
+            return resolution
+    return resolution
+
+def resample_pivot(df_pivot, resolution):
+    """Sum a date x category pivot into buckets labelled by their first day."""
+    if resolution == "day" or df_pivot.empty:
+        return df_pivot
+    buckets = df_pivot.index.to_period(RESOLUTIONS[resolution]).start_time
+    return df_pivot.groupby(buckets).sum()
+
+def downsample_pivot(df_pivot, point_budget=DEFAULT_POINT_BUDGET):
+    """Resample the pivot to the finest resolution that fits point_budget buckets.
+
+    When even the coarsest buckets are too many, LTTB over the bucket
+    totals picks the point_budget of them to keep. Returns (pivot,
+    resolution name).
+    """
+    if df_pivot.empty:
+        return df_pivot, "day"
+    resolution = choose_resolution(df_pivot.index.min(), df_pivot.index.max(), point_budget)
+    resampled = resample_pivot(df_pivot, resolution)
+    if len(resampled) > point_budget:
+        x_ms = resampled.index.values.astype("datetime64[ms]").astype("int64")
+        resampled = resampled.iloc[lttb(x_ms, resampled.sum(axis=1).to_numpy(dtype="float64"), point_budget)]
+    return resampled, resolution
+
+def titled(title, resolution):
+    label = RESOLUTION_LABELS.get(resolution)
+    return f"{title} ({label})" if label else title
+
+# --- LTTB ---
+def lttb(x, y, threshold):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps.
+
+    ``x`` and ``y`` are numeric 1-D arrays of equal length with ``x``
+    ascending. The first and last points are always kept.
+    """
+    return lttb_columns(x, np.asarray(y).reshape(-1, 1), threshold)[:, 0]
+
+def lttb_columns(x, ys, threshold):
+    """lttb() for every column of the (n, k) array ys at once; returns (threshold, k) indices.
+
+    Bucket bounds and next-bucket averages are computed for all buckets up
+    front. Only the choice of each bucket's point depends on the previous
+    one, so the remaining loop runs once per bucket for all columns
+    together rather than once per bucket per column.
+    """
+    n, k = ys.shape
+    if threshold >= n:
+        return np.repeat(np.arange(n)[:, None], k, axis=1)
+    if threshold < 3:
+        # Too few points for a triangle: keep the ends.
+        ends = np.linspace(0, n - 1, max(threshold, 1)).astype("int64")
+        return np.repeat(ends[:, None], k, axis=1)
+
+    x = np.asarray(x, dtype="float64")
+    ys = np.asarray(ys, dtype="float64")
+    # Bucket edges over the interior points 1 .. n-2; bucket i is
+    # [edges[i], edges[i + 1]), and its "next" bucket the one after it (the
+    # last point alone for the final bucket).
+    edges = np.linspace(1, n - 1, threshold - 1).astype("int64")
+    next_lo = edges[1:]
+    next_hi = np.append(edges[2:], n)
+    x_sums = np.concatenate([[0.0], np.cumsum(x)])
+    y_sums = np.concatenate([np.zeros((1, k)), np.cumsum(ys, axis=0)])
+    counts = (next_hi - next_lo)[:, None]
+    avg_x = (x_sums[next_hi] - x_sums[next_lo]) / counts[:, 0]
+    avg_y = (y_sums[next_hi] - y_sums[next_lo]) / counts
+
+    # Every bucket as a row of point indices, padded by repeating its last
+    # point (a repeat never wins argmax over the original).
+    lo, hi = edges[:-1], edges[1:]
+    width = int((hi - lo).max())
+    members = np.minimum(lo[:, None] + np.arange(width), hi[:, None] - 1)
+    bucket_x = x[members]
+    bucket_y = ys[members]
+    columns = np.arange(k)
+
+    kept = np.empty((threshold, k), dtype="int64")
+    kept[0] = 0
+    kept[-1] = n - 1
+    a = np.zeros(k, dtype="int64")
+    for i in range(threshold - 2):
+        xa, ya = x[a], ys[a, columns]
+        area = np.abs(
+            (xa - avg_x[i]) * (bucket_y[i] - ya)
+            - (xa - bucket_x[i][:, None]) * (avg_y[i] - ya)
+        )
+        a = members[i, area.argmax(axis=0)]
+        kept[i + 1] = a
+    return kept
+
+def downsample_series(df_pivot, point_budget=DEFAULT_POINT_BUDGET):
+    """Per-column (x, y) series for line charts, each at most point_budget points.
+
+    Returns ({column: (DatetimeIndex, values)}, resolution name).
+    """
+    if df_pivot.empty:
+        return {}, "day"
+    resolution = choose_resolution(
+        df_pivot.index.min(), df_pivot.index.max(), point_budget * LTTB_OVERSAMPLE
+    )
+    resampled = resample_pivot(df_pivot, resolution)
+    x_ms = resampled.index.values.astype("datetime64[ms]").astype("int64")
+
+    values = resampled.to_numpy(dtype="float64")
+    keep = lttb_columns(x_ms, values, point_budget)
+    series = {
+        column: (resampled.index[keep[:, j]], values[keep[:, j], j])
+        for j, column in enumerate(resampled.columns)
+    }
+    return series, resolution
+
+# --- Zoom ---
+# post_script for the bar and line chart pages the app serves (standalone
+# files embed every point instead; see render_chart). When the x axis
+# is zoomed (or reset), it asks layout.meta.series_url for the visible
+# window at the resolution that window affords and swaps the traces in
+# place, so a long history is never shipped at full resolution.
+ZOOM_SCRIPT = """
+(function () {
+    var gd = document.getElementById('{plot_id}');
+    var meta = gd.layout.meta || {};
+    if (!meta.series_url) { return; }
+    var timer = null, requestSeq = 0;
+
+    function windowOf(ev) {
+        if (ev['xaxis.autorange']) { return {}; }
+        var start = ev['xaxis.range[0]'], end = ev['xaxis.range[1]'];
+        if (start === undefined && ev['xaxis.range']) {
+            start = ev['xaxis.range'][0];
+            end = ev['xaxis.range'][1];
+        }
+        if (start === undefined) { return null; }
+        return {start_date: String(start).slice(0, 10), end_date: String(end).slice(0, 10)};
+    }
+
+    function load(range) {
+        var seq = ++requestSeq;
+        var params = new URLSearchParams(range);
+        fetch(meta.series_url + (meta.series_url.indexOf('?') < 0 ? '?' : '&') + params)
+            .then(function (r) { return r.json(); })
+            .then(function (payload) {
+                if (seq !== requestSeq || payload.error) { return; }
+                // Every trace shares the same style for a given point count.
+                var byName = {}, style = payload.style || {};
+                payload.traces.forEach(function (t) { byName[t.name] = t; });
+                var update = {x: [], y: []}, indices = [];
+                Object.keys(style).forEach(function (attr) { update[attr] = []; });
+                gd.data.forEach(function (trace, i) {
+                    var t = byName[trace.name] || {x: [], y: []};
+                    indices.push(i);
+                    update.x.push(t.x);
+                    update.y.push(t.y);
+                    Object.keys(style).forEach(function (attr) { update[attr].push(style[attr]); });
+                });
+                Plotly.restyle(gd, update, indices);
+                if (payload.title) { Plotly.relayout(gd, {'title.text': payload.title}); }
+            });
+    }
+
+    gd.on('plotly_relayout', function (ev) {
+        var range = windowOf(ev);
+        if (range === null) { return; }
+        clearTimeout(timer);
+        timer = setTimeout(function () { load(range); }, 250);
+    });
+})();
+"""
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_MAX_DISK_BYTES = 256 * 1024 * 1024
+
+
+class FigureCache:
+    """Figures keyed on (chart type, parameters, data watermark).
+
+    A figure is only rebuilt when the data watermark moves or it is asked
+    for with new parameters. The in-memory tier is an LRU bounded by entry
+    count. The optional disk tier keeps serialized figure JSON under
+    ``disk_dir``, bounded by total bytes, and survives restarts. Cached
+    figures are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, disk_dir=None,
+                 max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._stats = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "disk_evictions": 0,
+        }
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    # --- Keys ---
+    @staticmethod
+    def make_key(chart_type, params, data_version):
+        return (chart_type, json.dumps(params or {}, sort_keys=True, default=str), data_version)
+
+    def _disk_path(self, key):
+        digest = hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, f"{key[0]}-{digest[:32]}.json")
+
+    # --- Lookup ---
+    def get_or_build(self, chart_type, params, data_version, build):
+        """Return the cached figure for the key, calling build() on a miss."""
+        key = self.make_key(chart_type, params, data_version)
+        with self._lock:
+            fig = self._memory.get(key)
+            if fig is not None:
+                self._memory.move_to_end(key)
+                self._stats["hits"] += 1
+                return fig
+
+        fig = self._load_from_disk(key)
+        if fig is not None:
+            with self._lock:
+                self._stats["disk_hits"] += 1
+                self._remember(key, fig)
+            return fig
+
+        # Built outside the lock; two concurrent misses may both build, which
+        # is cheaper than serializing every build behind one lock.
+        fig = build()
+        with self._lock:
+            self._stats["misses"] += 1
+            self._remember(key, fig)
+        self._store_on_disk(key, fig)
+        return fig
+
+    def _remember(self, key, fig):
+        # Entries for the same chart and parameters at an older watermark can
+        # never be asked for again, so drop them straight away.
+        stale = [k for k in self._memory if k[:2] == key[:2] and k[2] != key[2]]
+        for old_key in stale:
+            del self._memory[old_key]
+            self._stats["evictions"] += 1
+
+        self._memory[key] = fig
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    # --- Disk Tier ---
+    def _load_from_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                fig = pio.from_json(file.read(), skip_invalid=True)
+        except (FileNotFoundError, ValueError):
+            return None
+        os.utime(path)  # mark as recently used for eviction
+        return fig
+
+    def _store_on_disk(self, key, fig):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(fig.to_json())
+        os.replace(tmp_path, path)
+        self._evict_disk()
+
+    def _evict_disk(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith(".json"):
+                stat = os.stat(os.path.join(self.disk_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.disk_dir, name))
+            except FileNotFoundError:
+                continue
+            total -= size
+            with self._lock:
+                self._stats["disk_evictions"] += 1
+
+    # --- Stats ---
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._memory), max_entries=self.max_entries)
+        if self.disk_dir:
+            stats["disk_bytes"] = sum(
+                os.path.getsize(os.path.join(self.disk_dir, name))
+                for name in os.listdir(self.disk_dir) if name.endswith(".json")
+            )
+            stats["max_disk_bytes"] = self.max_disk_bytes
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+
+# Process-wide cache used by the chart modules. Set FIGURE_CACHE_DIR to add
+# the on-disk tier.
+default_cache = FigureCache(
+    max_entries=int(os.environ.get("FIGURE_CACHE_ENTRIES", DEFAULT_MAX_ENTRIES)),
+    disk_dir=os.environ.get("FIGURE_CACHE_DIR") or None,
+    max_disk_bytes=int(os.environ.get("FIGURE_CACHE_DISK_BYTES", DEFAULT_MAX_DISK_BYTES)),
+)
@@ -1,10 +1,18 @@
-import sqlite3
 from datetime import datetime, timedelta
 import random
 
+import migrations
+import rollup
+import storage
+import units
+import watermark
+
 # Connect to the SQLite database
-conn = sqlite3.connect('database.sqlite')
+conn = storage.connect('database.sqlite')
 cursor = conn.cursor()
+migrations.migrate(conn)
+rollup.ensure_table(conn)
+watermark.ensure_table(conn)
 
 # Define the categories, amount ranges, and sample descriptions
 categories = ['Housing', 'Food', 'Transportation', 'Entertainment', 'Healthcare', 'Shopping', 'Others']
@@ -34,18 +42,23 @@ start_date = datetime(2025, 3, 28)
 end_date = datetime(2025, 4, 15)
 date_range = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
 
-# Insert 10 entries for each category for each date
+# Build one entry for each category for each date
+rows = []
 for date in date_range:
     for category in categories:
         # Random amount within the specified range for each category
         amount = round(random.uniform(amounts[category][0], amounts[category][1]), 2)
         # Random description for the category
         description = random.choice(descriptions[category])
-        # Insert data into the database
-        cursor.execute('''
-            INSERT INTO "transaction" (amount, category, description, date)
-            VALUES (?, ?, ?, ?)
-        ''', (amount, category, description, date.strftime('%Y-%m-%d')))
+        rows.append((units.amount_to_cents(amount), category, description, units.date_to_day(date)))
+
+# Insert all entries in a single batch
+cursor.executemany('''
+    INSERT INTO "transaction" (amount_cents, category, description, day)
+    VALUES (?, ?, ?, ?)
+''', rows)
+rollup.apply_insert(conn, ((day, category, cents) for cents, category, _, day in rows))
+watermark.bump(conn)
 
 # Commit the changes and close the connection
 conn.commit()
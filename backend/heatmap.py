@@ -1,58 +1,111 @@
-import sqlite3
+import logging
+import os
+
+import numpy as np
 import pandas as pd
 import plotly.graph_objs as go
-import plotly.offline as pyo
-
-# --- Database Connection ---
-def connect_to_db(db_file):
-    return sqlite3.connect(db_file)
-
-# --- Fetch Data from Database ---
-def fetch_data_from_db(conn):
-    query = "SELECT amount, category, date FROM 'transaction'"
-    df = pd.read_sql_query(query, conn)
-
-    print("\n--- RAW DATA FROM DATABASE ---")
-    print(df.head())  # Print first few rows
-    print(df.dtypes)  # Print data types
 
-    return df
+import data_access
+import downsample
+import metrics
+import plot_output
+from figure_cache import default_cache
+
+log = logging.getLogger(__name__)
+
+# The heatmap never draws more than this many cells (date buckets x
+# category columns); long histories are binned into weeks or months
+# until they fit.
+DEFAULT_CELL_BUDGET = int(os.environ.get("HEATMAP_CELL_BUDGET", 20_000))
+
+# Categories beyond the largest this many (by total spend) are summed
+# into the app's catch-all category.
+DEFAULT_TOP_CATEGORIES = int(os.environ.get("HEATMAP_TOP_CATEGORIES", 24))
+OTHER_CATEGORY = "Others"
+
+# Row label format for each date bucket size.
+DATE_FORMATS = {
+    "day": "%b %d, %Y",
+    "week": "Week of %b %d, %Y",
+    "month": "%b %Y",
+    "quarter": "%b %Y",
+    "year": "%Y",
+}
 
 # --- Data Preparation ---
-def prepare_data_for_plot(df):
-    print("\n--- BEFORE CONVERSION ---")
-    print(df.dtypes)  # Check data types
-
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")  # Convert date
-    df.set_index("date", inplace=True)  # Ensure 'date' is the index
-
-    print("\n--- AFTER CONVERSION ---")
-    print(df.dtypes)  # Confirm 'date' is datetime64
-    print(df.head())  # Print first few rows
-
-    df_pivot = df.pivot_table(index=df.index, columns="category", values="amount", aggfunc="sum").fillna(0)
-
-    print("\n--- AFTER PIVOT ---")
-    print(df_pivot.index)  # Check index type
+def top_categories(df, top_n=DEFAULT_TOP_CATEGORIES):
+    """The top_n categories by total amount, largest first, and whether any were left out.
+
+    OTHER_CATEGORY is never ranked: it always collects the remainder.
+    """
+    totals = df.groupby("category", observed=True)["amount"].sum()
+    totals = totals.drop(OTHER_CATEGORY, errors="ignore").sort_values(ascending=False, kind="stable")
+    kept = [str(name) for name in totals.index[:top_n]]
+    return kept, len(totals) > top_n or (df["category"] == OTHER_CATEGORY).any()
+
+def prepare_data_for_plot(df, top_n=DEFAULT_TOP_CATEGORIES, cell_budget=DEFAULT_CELL_BUDGET,
+                          resolution=None):
+    """The date bucket x category frame of bin_data_for_plot(), without the resolution."""
+    return bin_data_for_plot(df, top_n, cell_budget, resolution)[0]
+
+@metrics.timed("prepare", chart="heatmap")
+def bin_data_for_plot(df, top_n=DEFAULT_TOP_CATEGORIES, cell_budget=DEFAULT_CELL_BUDGET,
+                      resolution=None):
+    """Bin (date, category, amount) rows into a date bucket x category frame.
+
+    Works on raw transactions or on the daily rollup rows. Columns are the
+    top_n categories plus OTHER_CATEGORY for the rest; rows are the finest
+    buckets (day, week, month, ...) that keep the grid within cell_budget,
+    unless ``resolution`` picks one. Every row is added straight into its
+    cell, so no day x category pivot is built on the way.
+
+    Returns (frame indexed by bucket start date, resolution name). ``df``
+    may also be a data_access.TransactionStream.
+    """
+    df = data_access.as_chart_frame(df)
+    if df.empty:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name="date")), resolution or "day"
+
+    columns, has_other = top_categories(df, top_n)
+    if has_other:
+        columns.append(OTHER_CATEGORY)
+    dates = pd.DatetimeIndex(df["date"])
+    if resolution is None:
+        resolution = downsample.choose_resolution(
+            dates.min(), dates.max(), max(cell_budget // len(columns), 1)
+        )
 
-    return df_pivot
+    periods = dates.to_period(downsample.RESOLUTIONS[resolution]).asi8
+    first = periods.min()
+    rows = periods - first
+    buckets = int(rows.max()) + 1
+    # Unranked categories land in the last column (OTHER_CATEGORY).
+    lookup = {name: i for i, name in enumerate(columns)}
+    codes = df["category"].astype(str).map(lookup).fillna(len(columns) - 1).to_numpy(dtype=np.int64)
+
+    cells = np.bincount(rows * len(columns) + codes,
+                        weights=df["amount"].to_numpy(dtype=np.float64),
+                        minlength=buckets * len(columns))
+    index = pd.PeriodIndex.from_ordinals(
+        np.arange(first, first + buckets), freq=downsample.RESOLUTIONS[resolution]
+    ).start_time.rename("date")
+    binned = pd.DataFrame(cells.reshape(buckets, len(columns)), index=index, columns=columns)
+    log.debug("binned %d rows into %d %s buckets x %d categories", len(df), buckets, resolution, len(columns))
+    metrics.add_rows("prepare", len(df), chart="heatmap")
+    return binned, resolution
 
 # --- Plotly Visualization ---
-def create_heatmap(df_pivot):
-    print("\n--- INDEX TYPE BEFORE PLOTTING ---")
-    print(type(df_pivot.index))  # Should be DatetimeIndex
-
+@metrics.timed("create", chart="heatmap")
+def create_heatmap(df_pivot, resolution="day"):
+    """Heatmap of a date x category frame, such as bin_data_for_plot returns."""
     if not isinstance(df_pivot.index, pd.DatetimeIndex):
-        print("⚠️ WARNING: df_pivot.index is not DatetimeIndex! Fixing now...")
+        log.warning("heatmap pivot index is %s, not DatetimeIndex; converting", type(df_pivot.index).__name__)
         df_pivot.index = pd.to_datetime(df_pivot.index, errors="coerce")  # Force conversion
 
-    print("\n--- FINAL INDEX TYPE ---")
-    print(type(df_pivot.index))  # Confirm it's DatetimeIndex
-
     heatmap = go.Heatmap(
         z=df_pivot.values,
         x=df_pivot.columns,
-        y=df_pivot.index.strftime('%b %d'),  # Format date
+        y=df_pivot.index.strftime(DATE_FORMATS[resolution]),
         colorscale="Viridis",
         colorbar=dict(title="Amount Spent"),
         hovertemplate=(
@@ -63,7 +116,7 @@ def create_heatmap(df_pivot):
     )
 
     layout = go.Layout(
-        title="Spending Heatmap Over Time",
+        title=downsample.titled("Spending Heatmap Over Time", resolution),
         xaxis=dict(title="Categories", tickangle=-45),
         yaxis=dict(title="Date"),
         plot_bgcolor="rgba(255, 255, 255, 1)",
@@ -78,13 +131,21 @@ def create_heatmap(df_pivot):
     fig = go.Figure(data=[heatmap], layout=layout)
     return fig
 
+# --- Render to File ---
+def render_chart(cycle, filename, standalone=False):
+    """Build the heatmap from the cycle's shared data and write it to filename."""
+    params = {"top_n": DEFAULT_TOP_CATEGORIES, "cells": DEFAULT_CELL_BUDGET, **cycle.filters}
+    fig = default_cache.get_or_build(
+        "heatmap", params, cycle.watermark(),
+        lambda: create_heatmap(*bin_data_for_plot(cycle.daily_totals())),
+    )
+    plot_output.write_figure(fig, filename, chart="heatmap", standalone=standalone)
+    return filename
+
 # --- Main Execution ---
 if __name__ == "__main__":
-    db_connection = connect_to_db("database.sqlite")
-    df = fetch_data_from_db(db_connection)
-    db_connection.close()
-
-    df_pivot = prepare_data_for_plot(df)
-    fig = create_heatmap(df_pivot)
+    # Same as: python render.py heatmap [options]
+    import sys
 
-    pyo.plot(fig, filename="static\plots\heatmap.htmlheatmap.html")
+    import render
+    sys.exit(render.main(["heatmap", *sys.argv[1:]]))
@@ -0,0 +1,61 @@
+import argparse
+import json
+import sys
+
+import ingest
+from app import app, db, render_scheduler, rollup_batch_updater, Transaction
+from render_queue import render_all
+
+# --- Command Line ---
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Bulk import transactions from a JSON array, CSV or NDJSON file."
+    )
+    parser.add_argument("path", help="file to import, or - to read from stdin")
+    parser.add_argument("--format", choices=sorted(ingest.READERS),
+                        help="input format (default: guessed from the file extension)")
+    parser.add_argument("--batch-size", type=int, default=ingest.DEFAULT_BATCH_SIZE,
+                        help="rows per executemany batch (default: %(default)s)")
+    parser.add_argument("--no-render", action="store_true",
+                        help="skip the chart refresh after the import")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    fmt = args.format or ingest.detect_format(args.path)
+    if fmt is None:
+        sys.exit("Could not guess the input format; pass --format")
+
+    stream = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+    try:
+        with app.app_context():
+            conn = db.engine.raw_connection()
+            try:
+                records = ingest.read_records(stream, fmt)
+                report = ingest.insert_records(
+                    conn, Transaction.__table__, records, args.batch_size,
+                    on_batch=rollup_batch_updater(conn),
+                )
+            finally:
+                conn.close()
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+    print(f"Imported {report['inserted']} of {report['received']} rows "
+          f"in {report['seconds']}s ({report['rows_per_sec']} rows/sec)")
+    for error in report["errors"]:
+        print(f"  row {error['row']}: {error['error']}", file=sys.stderr)
+    if report["error_count"] > len(report["errors"]):
+        print(f"  ... {report['error_count'] - len(report['errors'])} more errors", file=sys.stderr)
+
+    if report["inserted"] and not args.no_render:
+        errors = render_all(render_scheduler.db_file, render_scheduler.plot_dir,
+                            retention=render_scheduler.retention)
+        failed = {name: error for name, error in errors.items() if error}
+        print("Charts refreshed" if not failed else f"Chart refresh failed: {json.dumps(failed)}")
+
+    return 0 if report["inserted"] or not report["received"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
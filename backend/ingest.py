@@ -0,0 +1,169 @@
+import csv
+import io
+import json
+import time
+
+from sqlalchemy import Float, Integer, String
+
+import units
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+# --- Input Formats ---
+def iter_json_array(stream):
+    """Yield records from a JSON array document."""
+    records = json.load(stream)
+    if not isinstance(records, list):
+        raise ValueError("Expected a JSON array of transactions")
+    return iter(records)
+
+def iter_csv(stream):
+    """Yield records from CSV text with a header row."""
+    return csv.DictReader(stream)
+
+def iter_ndjson(stream):
+    """Yield records from newline-delimited JSON, one line at a time."""
+    for line in stream:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                # Hand the bad line on so it is reported like any other row.
+                yield ValueError(f"Invalid JSON: {exc}")
+
+READERS = {
+    "json": iter_json_array,
+    "csv": iter_csv,
+    "ndjson": iter_ndjson,
+}
+
+def detect_format(name):
+    """Guess the input format from a content type or a file name."""
+    name = (name or "").lower()
+    if "ndjson" in name or "jsonl" in name or "json-seq" in name:
+        return "ndjson"
+    if "csv" in name:
+        return "csv"
+    if "json" in name:
+        return "json"
+    return None
+
+def read_records(stream, fmt):
+    """Yield records from a binary stream in the given format."""
+    if fmt not in READERS:
+        raise ValueError(f"Unsupported format {fmt!r}; expected one of {sorted(READERS)}")
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    return READERS[fmt](text)
+
+# --- Validation ---
+def insert_columns(table):
+    """Columns a caller supplies on insert (everything but the primary key)."""
+    return [column for column in table.columns if not column.primary_key]
+
+def validate_record(record, columns):
+    """Check one record against the table columns and return a value tuple."""
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError("Expected an object with transaction fields")
+
+    values = []
+    for column in columns:
+        # Columns stored in other units than the API speaks (epoch days,
+        # cents) are read from their API field and converted.
+        field, to_storage = units.STORAGE_COLUMNS.get(column.name, (column.name, None))
+        value = record.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == "":
+            if not column.nullable:
+                raise ValueError(f"Missing required field '{field}'")
+            values.append(None)
+            continue
+
+        if to_storage is not None:
+            value = to_storage(value)
+        elif isinstance(column.type, Float):
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"'{column.name}' must be a number") from None
+        elif isinstance(column.type, Integer):
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"'{column.name}' must be an integer") from None
+        elif isinstance(column.type, String):
+            value = str(value)
+            if column.type.length and len(value) > column.type.length:
+                raise ValueError(f"'{column.name}' is longer than {column.type.length} characters")
+
+        values.append(value)
+    return tuple(values)
+
+# --- Batched Insert ---
+def _write_batch(cursor, sql, batch, on_batch):
+    cursor.executemany(sql, batch)
+    if on_batch is not None:
+        on_batch(batch)
+    return len(batch)
+
+def insert_records(conn, table, records, batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+    """Validate records and insert the good ones in one transaction.
+
+    ``conn`` is a DB-API connection. Rows are written with ``executemany``
+    every ``batch_size`` records and committed once at the end; rows that
+    fail validation are reported and skipped without aborting the import.
+    ``on_batch`` is called with each written batch of value tuples, inside
+    the same transaction.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+
+    columns = insert_columns(table)
+    sql = 'INSERT INTO "{}" ({}) VALUES ({})'.format(
+        table.name,
+        ", ".join(column.name for column in columns),
+        ", ".join("?" for _ in columns),
+    )
+
+    started = time.perf_counter()
+    received = inserted = error_count = 0
+    errors = []
+    batch = []
+    cursor = conn.cursor()
+    try:
+        for received, record in enumerate(records, start=1):
+            try:
+                batch.append(validate_record(record, columns))
+            except ValueError as exc:
+                error_count += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"row": received, "error": str(exc)})
+                continue
+
+            if len(batch) >= batch_size:
+                inserted += _write_batch(cursor, sql, batch, on_batch)
+                batch = []
+
+        if batch:
+            inserted += _write_batch(cursor, sql, batch, on_batch)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    seconds = time.perf_counter() - started
+    return {
+        "received": received,
+        "inserted": inserted,
+        "error_count": error_count,
+        "errors": errors,
+        "batch_size": batch_size,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": round(received / seconds, 1) if seconds > 0 else None,
+    }
@@ -1,31 +1,49 @@
-import sqlite3
 import pandas as pd
 import plotly.graph_objs as go
-import plotly.offline as pyo
 from datetime import datetime
 
-# --- Database Connection ---
-def connect_to_db(db_file):
-    """Connect to SQLite database."""
-    return sqlite3.connect(db_file)
-
-# --- Fetch Data from Database ---
-def fetch_data_from_db(conn):
-    """Fetch transaction data for all dates."""
-    query = "SELECT amount, category, date FROM 'transaction'"
-    return pd.read_sql_query(query, conn)
+import data_access
+import downsample
+import metrics
+import plot_output
+from figure_cache import default_cache
 
 # --- Data Preparation ---
+@metrics.timed("prepare", chart="line")
 def prepare_line_chart_data(df):
-    """Convert date column and aggregate spending by date and category."""
-    df["date"] = pd.to_datetime(df["date"])
-    df_pivot = df.pivot_table(index="date", columns="category", values="amount", aggfunc="sum").fillna(0)
+    """Convert date column and aggregate spending by date and category.
+
+    ``df`` may also be a data_access.TransactionStream.
+    """
+    df = data_access.as_chart_frame(df)
+    dates = pd.to_datetime(df["date"])  # no-op for frames from data_access
+    df_pivot = df.pivot_table(index=dates, columns="category", values="amount", aggfunc="sum").fillna(0)
     return df_pivot
 
+# Markers are dropped once a trace is dense enough that they would hide the line.
+MARKER_MAX_POINTS = 200
+
+def line_style(n_points):
+    """Per-trace attributes that depend on how many points are drawn."""
+    return {"mode": "lines+markers" if n_points <= MARKER_MAX_POINTS else "lines"}
+
 # --- Line Chart Visualization ---
-def create_chart(df_pivot):
-    """Create and plot a cartoon-style line chart."""
-    
+@metrics.timed("create", chart="line")
+def create_chart(df_pivot, point_budget=downsample.DEFAULT_POINT_BUDGET, series_url=None):
+    """Create and plot a cartoon-style line chart.
+
+    Each trace is bucketed and then LTTB-thinned to at most point_budget
+    points (``None`` draws every day). With ``series_url`` set, the page
+    script in downsample.ZOOM_SCRIPT refetches the zoomed window from it.
+    """
+    if point_budget:
+        series, resolution = downsample.downsample_series(df_pivot, point_budget)
+    else:
+        series = {category: (df_pivot.index, df_pivot[category].to_numpy())
+                  for category in df_pivot.columns}
+        resolution = "day"
+    style = line_style(max((len(x) for x, _ in series.values()), default=0))
+
     colors = {
         "Housing": "#4285F4",  # Blue
         "Food": "#34A853",  # Green
@@ -38,22 +56,24 @@ def create_chart(df_pivot):
     
     data = [
         go.Scatter(
-            x=df_pivot.index,
-            y=df_pivot[category],
-            mode="lines+markers",
+            x=plot_output.date_axis_values(x),
+            y=y,
+            mode=style["mode"],
             name=category,
             line=dict(color=colors.get(category, "#A9A9A9"), width=3),  # Line styling
             marker=dict(size=8, line=dict(color='black', width=2)),  # Cartoonish marker
             hovertemplate=f"Category: {category}<br>Date: %{{x}}<br>Amount: %{{y}}<br><extra></extra>"
         )
-        for category in df_pivot.columns
+        for category, (x, y) in series.items()
     ]
 
     layout = go.Layout(
-        title="Spending Trends Over Time",
+        title=downsample.titled("Spending Trends Over Time", resolution),
+        meta={"resolution": resolution, "series_url": series_url, "style": style},
         xaxis_title="Date",
         yaxis_title="Amount Spent",
         xaxis=dict(
+            type="date",
             tickangle=45,
             showgrid=True,
             tickformat="%b %d",
@@ -81,22 +101,32 @@ def create_chart(df_pivot):
     fig = go.Figure(data=data, layout=layout)
     return fig
 
+# --- Render to File ---
+SERIES_URL = "/chart_series/line"
+
+def render_chart(cycle, filename, standalone=False):
+    """Build the line chart from the cycle's shared data and write it to filename.
+
+    A ``standalone`` file cannot reach SERIES_URL, so it embeds every day of
+    the cycle's range instead of a downsampled view that refines on zoom.
+    """
+    if standalone:
+        point_budget, series_url, post_script = None, None, None
+    else:
+        point_budget, series_url, post_script = downsample.DEFAULT_POINT_BUDGET, SERIES_URL, downsample.ZOOM_SCRIPT
+    params = {"points": point_budget, "series_url": series_url, **cycle.filters}
+    fig = default_cache.get_or_build(
+        "line", params, cycle.watermark(),
+        lambda: create_chart(cycle.daily_pivot(), point_budget=point_budget, series_url=series_url),
+    )
+    plot_output.write_figure(fig, filename, post_script=post_script, chart="line",
+                             standalone=standalone)
+    return filename
+
 # --- Main Execution ---
 if __name__ == "__main__":
-    # Connect to the database
-    db_connection = connect_to_db("database.sqlite")
-    
-    # Fetch data from the database
-    df = fetch_data_from_db(db_connection)
-    
-    # Close the database connection
-    db_connection.close()
-    
-    # Prepare the data for the line chart
-    df_pivot = prepare_line_chart_data(df)
-    
-    # Create the line chart
-    fig = create_chart(df_pivot)
-    
-    # Plot the chart
-    pyo.plot(fig, filename="static\plots\line_chart.htmlspending_line_chart.html")
+    # Same as: python render.py line [options]
+    import sys
+
+    import render
+    sys.exit(render.main(["line", *sys.argv[1:]]))
@@ -0,0 +1,152 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+# In-process instrumentation, exported in the Prometheus text format by
+# GET /metrics. Every process (each ASGI worker, the dashboard) keeps its
+# own registry, so scrape each one or sum across them.
+
+# Seconds; spans run from sub-millisecond SQL to multi-second renders.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# name -> (type, help)
+METRICS = {
+    "finance_stage_seconds": ("histogram", "Time spent in each chart pipeline stage."),
+    "finance_rows_processed_total": ("counter", "Rows read or aggregated by each stage."),
+    "finance_payload_bytes_total": ("counter", "Bytes produced by each stage (HTML, JSON)."),
+    "finance_sql_query_seconds": ("histogram", "SQLite statement execution time by statement kind."),
+    "finance_http_request_seconds": ("histogram", "Flask request handling time by route."),
+    "finance_http_response_bytes_total": ("counter", "Response body bytes by route (when known up front)."),
+}
+
+# --- Registry ---
+def _label_key(labels):
+    return tuple(sorted((name, value) for name, value in labels.items() if value is not None))
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+class Registry:
+    """Thread-safe counters and histograms keyed by (name, labels)."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                # Per-bucket (not cumulative) counts, one slot for +Inf, then the sum.
+                entry = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[slot] += 1
+            entry[-1] += value
+
+    def export(self):
+        """Picklable copy of everything recorded, for merge() in another process."""
+        with self._lock:
+            return dict(self._counters), {key: list(entry) for key, entry in self._histograms.items()}
+
+    def merge(self, state):
+        """Add another registry's export() into this one."""
+        counters, histograms = state
+        with self._lock:
+            for key, value in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, entry in histograms.items():
+                mine = self._histograms.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+                for slot, value in enumerate(entry):
+                    mine[slot] += value
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """Everything recorded so far, in the Prometheus text exposition format."""
+        counters, histograms = self.export()
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (metric, key), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+                continue
+            for (metric, key), entry in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), entry[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {entry[-1]:.6f}")
+                lines.append(f"{name}_count{_format_labels(key)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# --- Spans ---
+@contextmanager
+def span(stage, **labels):
+    """Time the block as one ``stage`` observation; labels name the chart or dataset."""
+    began = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - began
+        registry.observe("finance_stage_seconds", elapsed, stage=stage, **labels)
+        log.debug("%s %s took %.4fs", stage, labels, elapsed)
+
+def timed(stage, **labels):
+    """Decorator form of span()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def add_rows(stage, rows, **labels):
+    registry.inc("finance_rows_processed_total", rows, stage=stage, **labels)
+
+def add_bytes(stage, size, **labels):
+    registry.inc("finance_payload_bytes_total", size, stage=stage, **labels)
+
+# --- SQL ---
+def statement_kind(sql):
+    """First keyword of a statement (select, insert, pragma, ...), for a low-cardinality label."""
+    word = sql.lstrip().split(None, 1)[:1]
+    return word[0].lower() if word else "empty"
+
+def observe_query(sql, elapsed):
+    registry.observe("finance_sql_query_seconds", elapsed, kind=statement_kind(sql))
+
+# --- HTTP ---
+def observe_request(route, method, status, elapsed, size=None):
+    registry.observe("finance_http_request_seconds", elapsed, route=route, method=method, status=status)
+    if size is not None:
+        registry.inc("finance_http_response_bytes_total", size, route=route)
@@ -0,0 +1,100 @@
+import sys
+
+import rollup
+import watermark
+
+# Schema changes to databases created by older versions, tracked with
+# SQLite's PRAGMA user_version. migrate() runs at startup before the
+# tables are created, so a fresh database simply starts at SCHEMA_VERSION.
+SCHEMA_VERSION = 1
+
+# Rows an older database holds that cannot be converted (an unparseable
+# date) are moved here untouched rather than dropped.
+REJECTS_TABLE = "transaction_migration_rejects"
+
+# --- Helpers ---
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+# --- Steps ---
+def _integer_units(conn):
+    """v1: ISO text dates -> epoch day, float amounts -> integer cents (see units.py)."""
+    if "date" not in _columns(conn, "transaction"):
+        return
+    conn.execute("""
+        CREATE TABLE transaction_v1 (
+            id INTEGER NOT NULL PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            amount_cents INTEGER NOT NULL,
+            category VARCHAR(50) NOT NULL,
+            day INTEGER NOT NULL
+        )
+    """)
+    # date() normalises to midnight (and rejects malformed text with NULL),
+    # so the julian day difference is always a whole number of days.
+    conn.execute("""
+        INSERT INTO transaction_v1 (id, description, amount_cents, category, day)
+        SELECT id, description, CAST(ROUND(amount * 100) AS INTEGER), category,
+               CAST(julianday(date(date)) - 2440587.5 AS INTEGER)
+        FROM "transaction"
+        WHERE date(date) IS NOT NULL AND amount IS NOT NULL
+    """)
+    conn.execute(f'CREATE TABLE IF NOT EXISTS {REJECTS_TABLE} AS SELECT * FROM "transaction" WHERE 0')
+    conn.execute(f"""
+        INSERT INTO {REJECTS_TABLE}
+        SELECT * FROM "transaction" WHERE date(date) IS NULL OR amount IS NULL
+    """)
+    conn.execute('DROP TABLE "transaction"')
+    conn.execute('ALTER TABLE transaction_v1 RENAME TO "transaction"')
+    # The rollup is rebuilt in the new units by rollup.ensure_table.
+    conn.execute(f"DROP TABLE IF EXISTS {rollup.TABLE}")
+
+STEPS = (
+    (1, _integer_units),
+)
+
+# --- Migration ---
+def migrate(conn):
+    """Bring the database up to SCHEMA_VERSION; a no-op once it is there.
+
+    Every pending step runs in one transaction and the data watermark is
+    bumped, so cached figures and plots built from the old schema are
+    rebuilt.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return version
+
+    has_data = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transaction'"
+    ).fetchone()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if has_data:
+            for step_version, step in STEPS:
+                if version < step_version:
+                    step(conn)
+            watermark.ensure_table(conn)
+            watermark.bump(conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    if has_data:
+        # The rewrite went through the WAL; fold it back into the main file.
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return SCHEMA_VERSION
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    import storage
+
+    db_file = sys.argv[1] if len(sys.argv) > 1 else "database.sqlite"
+    conn = storage.connect(db_file)
+    before = conn.execute("PRAGMA user_version").fetchone()[0]
+    after = migrate(conn)
+    rollup.ensure_table(conn)
+    conn.commit()
+    conn.close()
+    print(f"Schema version {before} -> {after}.")
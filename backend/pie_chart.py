@@ -1,94 +1,178 @@
-import sqlite3
 import pandas as pd
 import plotly.graph_objs as go
-import plotly.offline as pyo
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
-# --- Database Connection ---
-def connect_to_db(db_file):
-    """Connect to SQLite database."""
-    return sqlite3.connect(db_file)
+import data_access
+import metrics
+import plot_output
+from figure_cache import default_cache
 
-# --- Fetch Data from Database ---
-def fetch_data_from_db(conn):
-    """Fetch transaction data for all dates."""
-    query = "SELECT amount, category, date FROM 'transaction'"
-    return pd.read_sql_query(query, conn)
+COLORS = {
+    "Housing": "#4285F4",  # Blue
+    "Food": "#34A853",  # Green
+    "Transportation": "#FBBC05",  # Yellow
+    "Entertainment": "#A142F4",  # Purple
+    "Healthcare": "#EA4335",  # Red
+    "Shopping": "#F06292",  # Pink
+    "Others": "#808080"  # Gray
+}
+DEFAULT_COLOR = "#A9A9A9"
 
 # --- Data Preparation ---
-def prepare_pie_chart_data(df, period, value):
-    """Aggregate amounts by category for the selected period (week or month)."""
-    df["date"] = pd.to_datetime(df["date"])
-    
+PERIODS = ("Month", "Week")
+
+def period_key(year, number):
+    """Year-qualified period key: 202503 is March 2025 (or ISO week 3 of 2025)."""
+    return year * 100 + number
+
+def period_label(period, key):
+    year, number = divmod(int(key), 100)
     if period == "Month":
-        df = df[df["date"].dt.month == value]
+        return f"{datetime(2000, number, 1).strftime('%B')} {year}"
+    return f"Week {number} {year}"
+
+def period_range(period, key):
+    """First and last ISO date covered by a period key."""
+    year, number = divmod(int(key), 100)
+    if period == "Month":
+        start = date(year, number, 1)
+        end = date(year + number // 12, number % 12 + 1, 1) - timedelta(days=1)
     elif period == "Week":
-        df = df[df["date"].dt.isocalendar().week == value]
-    
-    category_totals = df.groupby("category")["amount"].sum()
-    return category_totals
+        start = date.fromisocalendar(year, number, 1)
+        end = start + timedelta(days=6)
+    else:
+        raise ValueError(f"Unknown period {period!r}; expected one of {PERIODS}")
+    return start.isoformat(), end.isoformat()
 
-# --- Pie Chart Visualization ---
-def create_pie_chart(df):
-    """Create and plot a cartoon-style pie chart with selectable timeframes."""
-    colors = {
-        "Housing": "#4285F4",  # Blue
-        "Food": "#34A853",  # Green
-        "Transportation": "#FBBC05",  # Yellow
-        "Entertainment": "#A142F4",  # Purple
-        "Healthcare": "#EA4335",  # Red
-        "Shopping": "#F06292",  # Pink
-        "Others": "#808080"  # Gray
+def period_keys(dates):
+    """Month and ISO-week keys for a column of dates, computed vectorized."""
+    dates = pd.to_datetime(dates)  # no-op for frames from data_access
+    iso = dates.dt.isocalendar()
+    return {
+        "Month": period_key(dates.dt.year.astype("int64"), dates.dt.month.astype("int64")),
+        "Week": period_key(iso["year"].astype("int64"), iso["week"].astype("int64")),
     }
-    
-    months = {i: datetime(2000, i, 1).strftime("%B") for i in range(1, 13)}
-    weeks = [f"Week {i}" for i in range(1, 53)]
-    
-    data = []
-    for period, values in [("Month", months.keys()), ("Week", range(1, 53))]:
-        for value in values:
-            filtered_data = prepare_pie_chart_data(df, period, value)
-            trace = go.Pie(
-                labels=filtered_data.index,
-                values=filtered_data.values,
-                name=f"{period} {value}",
-                marker=dict(
-                    colors=[colors.get(cat, "#A9A9A9") for cat in filtered_data.index],
-                    line=dict(color='black', width=3)
-                ),
-                textinfo="label+percent",
-                hoverinfo="label+value+percent",
-                visible=False
-            )
-            data.append(trace)
-    
-    data[0]["visible"] = True  # Set the first pie chart as visible by default
-    
-    buttons = []
-    idx = 0
-    for period, values in [("Month", months.keys()), ("Week", range(1, 53))]:
-        for value in values:
-            buttons.append({
-                "label": f"{period} {value if period == 'Week' else months[value]}",
-                "method": "update",
-                "args": [
-                    {"visible": [i == idx for i in range(len(data))]},
-                    {"title": f"Spending Breakdown - {period} {value if period == 'Week' else months[value]}"}
-                ]
+
+def list_periods(df):
+    """Every month and week that has data, oldest first, as JSON-ready dicts."""
+    keys = period_keys(pd.Series(pd.to_datetime(df["date"]).unique()))
+    return [
+        {"period": period, "key": int(key), "label": period_label(period, key)}
+        for period in PERIODS
+        for key in sorted(keys[period].unique())
+    ]
+
+@metrics.timed("prepare", chart="pie")
+def prepare_pie_periods(df):
+    """Category totals for every month and ISO week present in df.
+
+    Dates are parsed and split into (year, month) and (ISO year, ISO week)
+    once, then a single groupby over (period, key, category) produces every
+    slice. Returns a Series indexed by those three levels, in chronological
+    order within each period type; periods without data are simply absent.
+    ``df`` may also be a data_access.TransactionStream.
+    """
+    df = data_access.as_chart_frame(df)
+    keys = period_keys(df["date"])
+    stacked = pd.concat(
+        [
+            pd.DataFrame({
+                "period": period,
+                "key": keys[period].to_numpy(),
+                "category": df["category"].to_numpy(),
+                "amount": df["amount"].to_numpy(),
             })
-            idx += 1
-    
-    layout = go.Layout(
-        title="Spending Breakdown by Category",
+            for period in PERIODS
+        ],
+        ignore_index=True,
+    )
+    return stacked.groupby(["period", "key", "category"], observed=True, sort=True)["amount"].sum()
+
+def prepare_pie_chart_data(df, period, value):
+    """Aggregate amounts by category for one period.
+
+    ``value`` is a year-qualified key from period_key, so the same month
+    (or week) of different years is no longer merged.
+    """
+    totals = prepare_pie_periods(df)
+    if (period, value) not in totals.index.droplevel("category"):
+        return totals.iloc[:0].droplevel(["period", "key"])
+    return totals.loc[(period, value)]
+
+# --- Pie Chart Visualization ---
+def _pie_trace(category_totals, label, visible):
+    return go.Pie(
+        labels=category_totals.index,
+        values=category_totals.values,
+        name=label,
+        marker=dict(
+            colors=[COLORS.get(cat, DEFAULT_COLOR) for cat in category_totals.index],
+            line=dict(color='black', width=3)
+        ),
+        textinfo="label+percent",
+        hoverinfo="label+value+percent",
+        visible=visible
+    )
+
+def _pie_layout(title, **kwargs):
+    return go.Layout(
+        title=title,
         font=dict(
             family="Comic Sans MS, sans-serif",
             size=16,
             color="black"
         ),
         paper_bgcolor="rgba(255, 255, 255, 1)",
+        **kwargs
+    )
+
+@metrics.timed("create", chart="pie")
+def create_pie_chart(df, lazy=False, slices_url="/pie_slices"):
+    """Create and plot a cartoon-style pie chart with selectable timeframes.
+
+    With ``lazy`` only the most recent month is embedded. The other periods
+    are listed in ``layout.meta`` and LAZY_SLICES_SCRIPT fetches them from
+    ``slices_url`` when picked, instead of shipping a hidden trace per period.
+    """
+    if lazy:
+        return _create_lazy_pie_chart(df, slices_url)
+
+    totals = prepare_pie_periods(df)
+    
+    data = []
+    labels = []
+    for period in PERIODS:
+        if period not in totals.index.get_level_values("period"):
+            continue
+        for key, category_totals in totals.loc[period].groupby(level="key", sort=False):
+            label = period_label(period, key)
+            data.append(_pie_trace(category_totals.droplevel("key"), label, visible=False))
+            labels.append((period, label))
+    
+    # Show the most recent month by default
+    month_indices = [i for i, (period, _) in enumerate(labels) if period == "Month"]
+    active = month_indices[-1] if month_indices else 0
+    if data:
+        data[active]["visible"] = True
+    
+    buttons = [
+        {
+            "label": label,
+            "method": "update",
+            "args": [
+                {"visible": [i == idx for i in range(len(data))]},
+                {"title": f"Spending Breakdown - {label}"}
+            ]
+        }
+        for idx, (_, label) in enumerate(labels)
+    ]
+    
+    layout = _pie_layout(
+        f"Spending Breakdown - {labels[active][1]}" if labels else "Spending Breakdown by Category",
         updatemenus=[
             {
                 "buttons": buttons,
+                "active": active,
                 "direction": "down",
                 "showactive": True,
             }
@@ -98,19 +182,84 @@ def create_pie_chart(df):
     fig = go.Figure(data=data, layout=layout)
     return fig
 
+def create_range_pie_chart(df, label):
+    """Single pie of category totals over everything in df, titled with label."""
+    category_totals = df.groupby("category", observed=True)["amount"].sum()
+    return go.Figure(
+        data=[_pie_trace(category_totals, label, visible=True)],
+        layout=_pie_layout(f"Spending Breakdown - {label}"),
+    )
+
+def _create_lazy_pie_chart(df, slices_url):
+    periods = list_periods(df)
+    months = [p for p in periods if p["period"] == "Month"]
+    if not months:
+        return go.Figure(data=[], layout=_pie_layout("Spending Breakdown by Category"))
+
+    default = months[-1]
+    start_date, end_date = period_range(default["period"], default["key"])
+    dates = pd.to_datetime(df["date"])
+    in_period = (dates >= start_date) & (dates <= end_date)
+    category_totals = df[in_period].groupby("category", observed=True)["amount"].sum()
+
+    layout = _pie_layout(
+        f"Spending Breakdown - {default['label']}",
+        meta={"periods": periods, "active": periods.index(default), "slices_url": slices_url},
+    )
+    return go.Figure(data=[_pie_trace(category_totals, default["label"], visible=True)], layout=layout)
+
+# Dropdown for lazy figures: fetches a period's slice the first time it is
+# picked and swaps it into the single pie trace.
+LAZY_SLICES_SCRIPT = """
+var gd = document.getElementById('{plot_id}');
+var meta = gd.layout.meta || {};
+var periods = meta.periods || [];
+if (!periods.length) { return; }
+var cache = {};
+var select = document.createElement('select');
+select.style.cssText = 'position:absolute;top:8px;left:8px;z-index:10;font:14px "Comic Sans MS", sans-serif;';
+periods.forEach(function (p, i) {
+    var option = document.createElement('option');
+    option.value = i;
+    option.textContent = p.label;
+    option.selected = i === meta.active;
+    select.appendChild(option);
+});
+function show(slice) {
+    Plotly.restyle(gd, {labels: [slice.labels], values: [slice.values], 'marker.colors': [slice.colors]}, [0]);
+    Plotly.relayout(gd, {'title.text': 'Spending Breakdown - ' + slice.label});
+}
+select.addEventListener('change', function () {
+    var p = periods[select.value];
+    var url = meta.slices_url + '?period=' + encodeURIComponent(p.period) + '&key=' + p.key;
+    if (cache[url]) { show(cache[url]); return; }
+    fetch(url)
+        .then(function (response) { return response.json(); })
+        .then(function (slice) { cache[url] = slice; show(slice); });
+});
+gd.parentNode.style.position = 'relative';
+gd.parentNode.insertBefore(select, gd);
+"""
+
+# --- Render to File ---
+def render_chart(cycle, filename, standalone=False):
+    """Build the lazy pie chart from the cycle's shared data and write it to filename.
+
+    A ``standalone`` file cannot fetch slices from /pie_slices, so it embeds
+    every period of the cycle's range up front.
+    """
+    lazy = not standalone
+    fig = default_cache.get_or_build(
+        "pie", {"lazy": lazy, **cycle.filters}, cycle.watermark(), lambda: create_pie_chart(cycle.daily_totals(), lazy=lazy)
+    )
+    plot_output.write_figure(fig, filename, post_script=LAZY_SLICES_SCRIPT if lazy else None, chart="pie",
+                             standalone=standalone)
+    return filename
+
 # --- Main Execution ---
 if __name__ == "__main__":
-    # Connect to the database
-    db_connection = connect_to_db("database.sqlite")
-    
-    # Fetch data from the database
-    df = fetch_data_from_db(db_connection)
-    
-    # Close the database connection
-    db_connection.close()
-    
-    # Create the pie chart
-    fig = create_pie_chart(df)
-    
-    # Plot the chart
-    pyo.plot(fig, filename="static\plots\pie_chart.htmlspending_pie_chart.html")
\ No newline at end of file
+    # Same as: python render.py pie [options]
+    import sys
+
+    import render
+    sys.exit(render.main(["pie", *sys.argv[1:]]))
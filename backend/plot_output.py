@@ -0,0 +1,99 @@
+import gzip
+import os
+import tempfile
+import threading
+
+import plotly
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+try:
+    import brotli
+except ImportError:  # optional; only gzip variants are written without it
+    brotli = None
+
+import metrics
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+ASSET_DIR = os.path.join(BASE_DIR, "static", "assets")
+
+# Versioned so the app can serve it with a year-long immutable cache header.
+PLOTLY_JS_NAME = f"plotly-{plotly.__version__}.min.js"
+PLOTLY_JS_URL = f"/assets/{PLOTLY_JS_NAME}"
+
+# (Content-Encoding, file suffix), in order of preference.
+COMPRESSED_VARIANTS = (("br", ".br"), ("gzip", ".gz"))
+
+# os.umask() can only be read by setting it, which is not safe once render
+# threads run, so it is read once at import.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# --- Compressed Variants ---
+def _write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        # mkstemp creates the file owner-only; published files get the
+        # usual mode, as open() would give them.
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def write_compressed_variants(path):
+    """Write .gz (and .br when brotli is installed) siblings of path."""
+    with open(path, "rb") as file:
+        data = file.read()
+    _write_atomic(path + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _write_atomic(path + ".br", brotli.compress(data))
+
+# --- Shared plotly.js ---
+_plotly_js_lock = threading.Lock()
+
+def ensure_plotly_js(asset_dir=ASSET_DIR):
+    """Write the plotly.js bundle the figures reference, once per plotly version."""
+    path = os.path.join(asset_dir, PLOTLY_JS_NAME)
+    with _plotly_js_lock:
+        if not os.path.exists(path + ".gz"):
+            os.makedirs(asset_dir, exist_ok=True)
+            _write_atomic(path, get_plotlyjs().encode("utf-8"))
+            write_compressed_variants(path)
+    return path
+
+# --- Compact Encoding ---
+def date_axis_values(index):
+    """Dates as epoch milliseconds.
+
+    Plotly ships numeric numpy arrays as base64 typed arrays, so this costs
+    about 11 bytes per point instead of a 21-character ISO string. Date
+    axes read plain numbers as epoch milliseconds.
+    """
+    return index.values.astype("datetime64[ms]").astype("int64").astype("float64")
+
+# --- Writer ---
+def write_figure(fig, filename, post_script=None, chart=None, standalone=False):
+    """Write fig as HTML that loads the shared plotly.js instead of inlining it.
+
+    The file appears atomically (temp file + rename), so readers never see a
+    partially written plot. ``chart`` labels the serialize/write metrics.
+    A ``standalone`` file inlines plotly.js so it opens without the server.
+    """
+    if not standalone:
+        ensure_plotly_js()
+    with metrics.span("serialize", chart=chart):
+        html = pio.to_html(
+            fig,
+            include_plotlyjs=True if standalone else PLOTLY_JS_URL,
+            post_script=post_script,
+            full_html=True,
+        ).encode("utf-8")
+    metrics.add_bytes("serialize", len(html), chart=chart)
+    with metrics.span("write", chart=chart):
+        _write_atomic(filename, html)
+        if not standalone:
+            write_compressed_variants(filename)
+    return filename
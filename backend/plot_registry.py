@@ -0,0 +1,101 @@
+import hashlib
+import os
+import uuid
+from datetime import datetime, timezone
+
+# Every published plot file is recorded here, so /latest_plot resolves the
+# current artifact with one indexed lookup instead of listing and stat-ing
+# the plot directory, and never sees a file that is still being written.
+TABLE = "plot_artifacts"
+
+CREATE_SQL = f"""
+CREATE TABLE IF NOT EXISTS {TABLE} (
+    plot_type VARCHAR(50) NOT NULL,
+    version INTEGER NOT NULL,
+    data_watermark INTEGER NOT NULL,
+    path VARCHAR(255) NOT NULL,
+    size INTEGER NOT NULL,
+    content_hash VARCHAR(64) NOT NULL,
+    created_at VARCHAR(50) NOT NULL,
+    PRIMARY KEY (plot_type, version)
+)
+"""
+
+COLUMNS = ("plot_type", "version", "data_watermark", "path", "size", "content_hash", "created_at")
+
+DEFAULT_RETENTION = 3
+
+# --- Table Management ---
+def ensure_table(conn):
+    conn.execute(CREATE_SQL)
+
+# --- Publishing ---
+def new_filename(filename):
+    """Unique file name for a new version of a plot, e.g. pie_chart-3f2a....html."""
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}-{uuid.uuid4().hex[:12]}{ext}"
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def publish(conn, plot_dir, plot_type, path, data_watermark, retention=DEFAULT_RETENTION):
+    """Record a fully written plot file as the newest version of plot_type.
+
+    ``path`` must already be complete on disk (the chart writers write to a
+    temporary file and rename it into place). Older versions beyond
+    ``retention`` are pruned from the registry and the disk.
+    """
+    ensure_table(conn)
+    name = os.path.relpath(path, plot_dir)
+    conn.execute(f"""
+        INSERT INTO {TABLE} ({", ".join(COLUMNS)})
+        SELECT ?1, COALESCE(MAX(version), 0) + 1, ?2, ?3, ?4, ?5, ?6
+        FROM {TABLE} WHERE plot_type = ?1
+    """, (
+        plot_type,
+        data_watermark,
+        name,
+        os.path.getsize(path),
+        _file_digest(path),
+        datetime.now(timezone.utc).isoformat(),
+    ))
+    conn.commit()
+    prune(conn, plot_dir, plot_type, retention)
+    return latest(conn, plot_type)
+
+def prune(conn, plot_dir, plot_type, retention=DEFAULT_RETENTION):
+    """Drop all but the newest ``retention`` versions of plot_type."""
+    stale = conn.execute(f"""
+        SELECT version, path FROM {TABLE}
+        WHERE plot_type = ? ORDER BY version DESC LIMIT -1 OFFSET ?
+    """, (plot_type, max(retention, 1))).fetchall()
+    if not stale:
+        return 0
+
+    conn.executemany(f"DELETE FROM {TABLE} WHERE plot_type = ? AND version = ?",
+                     [(plot_type, version) for version, _ in stale])
+    conn.commit()
+    # Imported here: plot_output pulls in plotly, and the render CLI reads
+    # the registry to decide whether it needs plotly at all.
+    import plot_output
+    for _, name in stale:
+        path = os.path.join(plot_dir, name)
+        for suffix in ("",) + tuple(suffix for _, suffix in plot_output.COMPRESSED_VARIANTS):
+            try:
+                os.remove(path + suffix)
+            except FileNotFoundError:
+                pass
+    return len(stale)
+
+# --- Lookup ---
+def latest(conn, plot_type):
+    """Newest artifact for plot_type as a dict, or None."""
+    row = conn.execute(f"""
+        SELECT {", ".join(COLUMNS)} FROM {TABLE}
+        WHERE plot_type = ? ORDER BY version DESC LIMIT 1
+    """, (plot_type,)).fetchone()
+    return None if row is None else dict(zip(COLUMNS, row))
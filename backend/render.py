@@ -0,0 +1,249 @@
+"""Render charts from the command line, optionally through a warm daemon.
+
+    python render.py bar|heatmap|line|pie|all [--db FILE] [--plot-dir DIR] [--force]
+    python render.py pie -o report.html --start-date 2024-01-01 --end-date 2024-03-31
+    python render.py daemon [--pool process|thread|serial] [--workers N]
+    python render.py daemon --stop
+
+Charts are written to the plot directory and published to the plot
+registry, exactly as the app's scheduler does. ``-o`` instead writes one
+self-contained HTML file (plotly.js inlined) that is not published, and
+may be narrowed to a date range.
+
+Only the standard library is imported up front: ``--help``, argument
+errors and runs where every chart is already at the current data
+watermark finish before pandas or plotly are loaded. The first real job
+in a process pays that import once; ``render.py daemon`` pays it at start
+and then takes jobs over a local socket (multiprocessing.connection,
+authenticated with a key kept in RENDER_DAEMON_KEY_FILE), so later runs
+skip it. Runs try the daemon first and fall back to rendering in-process.
+"""
+import argparse
+import os
+import secrets
+import sqlite3
+import sys
+import time
+from multiprocessing.connection import Client, Listener
+
+import plot_registry
+import watermark
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DB_FILE = os.environ.get("DATABASE_FILE") or os.path.join(BASE_DIR, "database.sqlite")
+PLOT_DIR = os.environ.get("PLOT_DIR") or os.path.join(BASE_DIR, "static", "plots")
+
+DAEMON_ADDRESS = ("127.0.0.1", int(os.environ.get("RENDER_DAEMON_PORT", "5058")))
+DAEMON_KEY_FILE = os.environ.get("RENDER_DAEMON_KEY_FILE") or os.path.join(BASE_DIR, ".render-daemon.key")
+
+# Same names as render_queue.CHART_BUILDERS, which cannot be imported here
+# without loading pandas and plotly.
+CHARTS = ("bar", "heatmap", "line", "pie")
+
+# --- Libraries ---
+def load_libraries():
+    """Import the chart pipeline; returns (render_queue module, seconds the import took)."""
+    started = time.perf_counter()
+    import render_queue
+    return render_queue, time.perf_counter() - started
+
+def create_executor(render_queue, pool, workers):
+    from concurrent.futures import ThreadPoolExecutor
+    if pool == "process":
+        return render_queue.create_process_pool(workers)
+    return ThreadPoolExecutor(max_workers=1 if pool == "serial" else workers)
+
+# --- Jobs ---
+# A job is a plain dict so it can be sent to the daemon as is:
+#   charts, db_file, plot_dir, force            publish to the plot registry
+#   output, start_date, end_date                 or write one standalone file
+def pending_charts(job):
+    """Charts in the job that are not built at the current data watermark.
+
+    Reads the database with sqlite3 directly, so an up-to-date run never
+    imports the chart libraries. Anything it cannot check counts as pending.
+    """
+    if job["force"] or job.get("output"):
+        return list(job["charts"])
+    try:
+        conn = sqlite3.connect(f"file:{job['db_file']}?mode=ro", uri=True)
+    except sqlite3.Error:
+        return list(job["charts"])
+    try:
+        version = watermark.read(conn)
+        pending = []
+        for name in job["charts"]:
+            try:
+                artifact = plot_registry.latest(conn, name)
+            except sqlite3.Error:  # registry table not created yet
+                artifact = None
+            if (not artifact or artifact["data_watermark"] != version
+                    or not os.path.exists(os.path.join(job["plot_dir"], artifact["path"]))):
+                pending.append(name)
+        return pending
+    finally:
+        conn.close()
+
+def run_job(job, render_queue, executor):
+    """Run a job in this process; returns {chart: error or None}."""
+    if job.get("output"):
+        from data_access import RenderCycle
+        (name,) = job["charts"]
+        filters = {key: job[key] for key in ("start_date", "end_date") if job.get(key)}
+        try:
+            with RenderCycle(job["db_file"], **filters) as cycle:
+                render_queue.CHART_BUILDERS[name][0](cycle, job["output"], standalone=True)
+        except Exception as exc:
+            return {name: f"{type(exc).__name__}: {exc}"}
+        return {name: None}
+    return render_queue.render_all(job["db_file"], job["plot_dir"], executor,
+                                   force=job["force"], charts=job["charts"])
+
+# --- Daemon ---
+def _read_key():
+    try:
+        with open(DAEMON_KEY_FILE, "rb") as file:
+            return file.read()
+    except OSError:
+        return None
+
+def _write_key():
+    key = secrets.token_bytes(32)
+    fd = os.open(DAEMON_KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as file:
+        file.write(key)
+    return key
+
+def send_to_daemon(message):
+    """Send one message to a running daemon; returns its reply, or None if none is running."""
+    key = _read_key()
+    if key is None:
+        return None
+    try:
+        conn = Client(DAEMON_ADDRESS, authkey=key)
+    except (OSError, EOFError):  # nothing listening, or a stale key from an older daemon
+        return None
+    with conn:
+        conn.send(message)
+        return conn.recv()
+
+def serve(pool, workers):
+    """Keep the chart libraries loaded and run jobs sent by send_to_daemon() until stopped.
+
+    Jobs run one at a time, in the order they arrive, against the same
+    executor and figure cache.
+    """
+    render_queue, import_seconds = load_libraries()
+    print(f"Loaded chart libraries in {import_seconds:.2f}s")
+    key = _write_key()
+    executor = create_executor(render_queue, pool, workers)
+    try:
+        with executor, Listener(DAEMON_ADDRESS, authkey=key) as listener:
+            print(f"Render daemon listening on {DAEMON_ADDRESS[0]}:{DAEMON_ADDRESS[1]} ({pool} pool)")
+            while True:
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError) as exc:  # failed handshake (e.g. wrong key)
+                    print(f"Rejected connection: {exc}")
+                    continue
+                with conn:
+                    try:
+                        message = conn.recv()
+                    except (OSError, EOFError):
+                        continue
+                    if message.get("command") == "stop":
+                        conn.send({"stopped": True})
+                        break
+                    started = time.perf_counter()
+                    try:
+                        reply = {"errors": run_job(message["job"], render_queue, executor)}
+                    except Exception as exc:  # report it to the client and keep serving
+                        reply = {"error": f"{type(exc).__name__}: {exc}"}
+                    reply["seconds"] = time.perf_counter() - started
+                    print(f"Job {message['job']['charts']} took {reply['seconds']:.2f}s")
+                    conn.send(reply)
+    finally:
+        if _read_key() == key:
+            os.unlink(DAEMON_KEY_FILE)
+    return 0
+
+# --- Main Execution ---
+def build_parser():
+    parser = argparse.ArgumentParser(description="Render the finance charts.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name in (*CHARTS, "all"):
+        command = commands.add_parser(
+            name, help="render every chart" if name == "all" else f"render the {name} chart")
+        command.add_argument("--db", default=DB_FILE, help="SQLite database (default: DATABASE_FILE)")
+        command.add_argument("--plot-dir", default=PLOT_DIR, help="where published plots go (default: PLOT_DIR)")
+        command.add_argument("--force", action="store_true", help="re-render charts that are up to date")
+        command.add_argument("--pool", choices=("process", "thread", "serial"), default="thread",
+                             help="in-process runs: build charts in worker processes, threads, or one at a time")
+        command.add_argument("--workers", type=int, default=len(CHARTS))
+        command.add_argument("--no-daemon", action="store_true", help="render in this process even if a daemon is running")
+        if name != "all":
+            command.add_argument("-o", "--output",
+                                 help="write a standalone HTML file here instead of publishing")
+            command.add_argument("--start-date", help="first day to include (ISO date; with --output)")
+            command.add_argument("--end-date", help="last day to include (ISO date; with --output)")
+
+    daemon = commands.add_parser("daemon", help="keep the chart libraries loaded and serve render jobs")
+    daemon.add_argument("--pool", choices=("process", "thread", "serial"), default="thread")
+    daemon.add_argument("--workers", type=int, default=len(CHARTS))
+    daemon.add_argument("--stop", action="store_true", help="stop a running daemon")
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.command == "daemon":
+        if args.stop:
+            reply = send_to_daemon({"command": "stop"})
+            print("Render daemon stopped" if reply else "No render daemon is running")
+            return 0 if reply else 1
+        return serve(args.pool, args.workers)
+
+    output = getattr(args, "output", None)
+    if not output and (getattr(args, "start_date", None) or getattr(args, "end_date", None)):
+        parser.error("--start-date/--end-date only apply to a standalone --output file")
+    job = {
+        "charts": list(CHARTS) if args.command == "all" else [args.command],
+        # Absolute, since a daemon may run from another directory.
+        "db_file": os.path.abspath(args.db),
+        "plot_dir": os.path.abspath(args.plot_dir),
+        "force": args.force,
+        "output": os.path.abspath(output) if output else None,
+        "start_date": getattr(args, "start_date", None),
+        "end_date": getattr(args, "end_date", None),
+    }
+
+    job["charts"] = pending_charts(job)
+    if not job["charts"]:
+        print("All charts are up to date")
+        return 0
+
+    started = time.perf_counter()
+    reply = None if args.no_daemon else send_to_daemon({"job": job})
+    if reply is not None:
+        if "error" in reply:
+            print(f"Render daemon failed: {reply['error']}")
+            return 1
+        errors, where = reply["errors"], f"daemon, job {reply['seconds']:.2f}s"
+    else:
+        render_queue, import_seconds = load_libraries()
+        print(f"Loaded chart libraries in {import_seconds:.2f}s")
+        job_started = time.perf_counter()
+        with create_executor(render_queue, args.pool, args.workers) as executor:
+            errors = run_job(job, render_queue, executor)
+        where = f"in-process, {args.pool} pool, job {time.perf_counter() - job_started:.2f}s"
+    for name, error in errors.items():
+        print(f"{name:8s} {error or 'ok'}")
+    if output and not any(errors.values()):
+        print(f"Wrote {job['output']}")
+    print(f"Rendered in {time.perf_counter() - started:.2f}s ({where})")
+    return 1 if any(errors.values()) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import ExitStack
+from datetime import datetime, timezone
+
+import bar_plot
+import changelog
+import columnar
+import heatmap
+import linechart
+import metrics
+import pie_chart
+import plot_registry
+import storage
+from data_access import RenderCycle
+from shared_frame import SharedFrame, attach
+
+# --- Chart Builders ---
+# Plot name -> (render function, base output filename). The plot name is the
+# registry key /latest_plot/<plot_type> looks up; each render writes a fresh
+# uniquely named file derived from the base name.
+CHART_BUILDERS = {
+    "bar": (bar_plot.render_chart, "cartoonish_stacked_bar.html"),
+    "heatmap": (heatmap.render_chart, "heatmap.html"),
+    "line": (linechart.render_chart, "line_chart.html"),
+    "pie": (pie_chart.render_chart, "pie_chart.html"),
+}
+
+
+# Cycle datasets the chart builders read; these make up the snapshot that
+# process-pool renders ship to their workers.
+SNAPSHOT_FRAMES = ("daily_totals",)
+
+@metrics.timed("render")
+def render_all(db_file, plot_dir, executor=None, retention=plot_registry.DEFAULT_RETENTION,
+               force=False, charts=None):
+    """Render and publish every chart (or the named ``charts``) once; return {plot name: error or None}.
+
+    All charts share one RenderCycle, so the data is read once per render
+    rather than once per chart. Each finished file is published to the plot
+    registry, which prunes versions beyond ``retention``. Charts whose
+    latest artifact was already built at the current data watermark are
+    skipped unless ``force`` is set.
+
+    With a process pool (see create_process_pool) the cycle's frames are
+    copied once into shared memory and every chart is built in its own
+    worker process from that same snapshot.
+    """
+    charts = list(CHART_BUILDERS) if charts is None else list(charts)
+    os.makedirs(plot_dir, exist_ok=True)
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=len(CHART_BUILDERS))
+
+    try:
+        with storage.get_pool(db_file).connection() as conn, ExitStack() as shared:
+            plot_registry.ensure_table(conn)
+            with RenderCycle(db_file) as cycle:
+                watermark = cycle.watermark()
+                pending = {}
+                for name in charts:
+                    filename = CHART_BUILDERS[name][1]
+                    artifact = plot_registry.latest(conn, name)
+                    if force or not artifact or artifact["data_watermark"] != watermark:
+                        pending[name] = os.path.join(plot_dir, plot_registry.new_filename(filename))
+
+                futures = {}
+                in_processes = isinstance(executor, ProcessPoolExecutor)
+                if pending and in_processes:
+                    snapshot = {"db_file": db_file, "watermark": watermark, "frames": {
+                        key: shared.enter_context(SharedFrame(frame)).spec
+                        for key, frame in cycle.frames(*SNAPSHOT_FRAMES).items()
+                    }}
+                    for name, path in pending.items():
+                        futures[name] = executor.submit(render_snapshot, name, snapshot, path)
+                else:
+                    for name, path in pending.items():
+                        futures[name] = executor.submit(CHART_BUILDERS[name][0], cycle, path)
+                wait(futures.values())
+
+            errors = {name: None for name in charts}
+            for name, future in futures.items():
+                exc = future.exception()
+                if exc is None:
+                    path = future.result()
+                    if in_processes:
+                        path, worker_metrics = path
+                        metrics.registry.merge(worker_metrics)
+                    plot_registry.publish(conn, plot_dir, name, path, watermark, retention)
+                else:
+                    errors[name] = f"{type(exc).__name__}: {exc}"
+    finally:
+        if own_executor:
+            executor.shutdown()
+    return errors
+
+# --- Process Pool ---
+def create_process_pool(max_workers=len(CHART_BUILDERS)):
+    """Worker processes for render_all, so figure building and serialization
+    are not serialized on one GIL.
+
+    Workers fork from a forkserver that has already imported the chart
+    modules, so a new worker does not pay the pandas/plotly import again.
+    """
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload([__name__])
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+
+def render_snapshot(name, snapshot, path):
+    """Worker process: build one chart from a shared snapshot and write it to path.
+
+    Stage metrics recorded here are folded back into the parent's registry.
+    """
+    frames = {key: attach(spec) for key, spec in snapshot["frames"].items()}
+    frames["watermark"] = snapshot["watermark"]
+    metrics.registry.reset()
+    with RenderCycle.from_frames(frames, snapshot["db_file"]) as cycle:
+        CHART_BUILDERS[name][0](cycle, path)
+    return path, metrics.registry.export()
+
+# --- Debounced Scheduler ---
+class RenderScheduler:
+    """Collapse bursts of data-changed events into one chart rebuild.
+
+    The first event after an idle period opens a debounce window; every
+    event that arrives before the window closes is folded into the same
+    rebuild. Events that arrive while a rebuild is running open the next
+    window, so the charts always end up reflecting the latest commit.
+    After each rebuild the columnar snapshot (if any) is brought up to date
+    and the change log is pruned to ``changelog_retention`` entries.
+    """
+
+    def __init__(self, db_file, plot_dir, debounce_seconds=2.0, max_workers=4,
+                 retention=plot_registry.DEFAULT_RETENTION, processes=False,
+                 changelog_retention=changelog.DEFAULT_RETENTION):
+        self.db_file = db_file
+        self.plot_dir = plot_dir
+        self.retention = retention
+        self.debounce_seconds = debounce_seconds
+        self.max_workers = max_workers
+        self.processes = processes
+        self.changelog_retention = changelog_retention
+
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._window_opened_at = None
+        self._rendering = False
+        self._thread = None
+        self._executor = None
+
+        self._render_count = 0
+        self._last_render_at = None
+        self._last_render_duration = None
+        self._last_errors = {}
+
+    def notify(self):
+        """Record a data-changed event; returns immediately."""
+        with self._cond:
+            self._pending += 1
+            if self._window_opened_at is None:
+                self._window_opened_at = time.monotonic()
+            self._ensure_worker()
+            self._cond.notify()
+
+    def status(self):
+        with self._cond:
+            return {
+                "queue_depth": self._pending,
+                "rendering": self._rendering,
+                "debounce_seconds": self.debounce_seconds,
+                "workers": self.max_workers,
+                "pool": "process" if self.processes else "thread",
+                "render_count": self._render_count,
+                "last_render_at": self._last_render_at,
+                "last_render_duration": self._last_render_duration,
+                "last_errors": {k: v for k, v in self._last_errors.items() if v},
+            }
+
+    def _ensure_worker(self):
+        # Started lazily so that importing the app (or the Flask reloader's
+        # parent process) does not spin up threads nobody uses.
+        if self._thread is None:
+            if self.processes:
+                self._executor = create_process_pool(self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="chart-render"
+                )
+            self._thread = threading.Thread(
+                target=self._run, name="render-scheduler", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = self._window_opened_at + self.debounce_seconds
+                remaining = deadline - time.monotonic()
+                while remaining > 0:
+                    self._cond.wait(remaining)
+                    remaining = deadline - time.monotonic()
+                self._pending = 0
+                self._window_opened_at = None
+                self._rendering = True
+
+            if self.processes and getattr(self._executor, "_broken", False):
+                # A worker died (e.g. OOM-killed) and broke the pool; start a fresh one.
+                self._executor.shutdown(wait=False)
+                self._executor = create_process_pool(self.max_workers)
+
+            started = time.perf_counter()
+            try:
+                errors = render_all(self.db_file, self.plot_dir, self._executor, self.retention)
+            except Exception as exc:  # keep the scheduler alive
+                errors = {"scheduler": f"{type(exc).__name__}: {exc}"}
+            try:
+                with storage.get_pool(self.db_file).connection() as conn:
+                    columnar.refresh_if_present(conn)
+                    changelog.prune(conn, self.changelog_retention)
+            except Exception as exc:
+                errors["maintenance"] = f"{type(exc).__name__}: {exc}"
+            duration = time.perf_counter() - started
+
+            with self._cond:
+                self._rendering = False
+                self._render_count += 1
+                self._last_render_at = datetime.now(timezone.utc).isoformat()
+                self._last_render_duration = round(duration, 4)
+                self._last_errors = errors
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    # Same as: python render.py all [options]
+    import sys
+
+    import render
+    sys.exit(render.main(["all", *sys.argv[1:]]))
@@ -0,0 +1,145 @@
+import sys
+
+import pandas as pd
+
+# Materialized per-day, per-category totals. The write paths in app.py and
+# ingest.py keep it up to date row by row, so the charts can read
+# days x categories rows instead of scanning and pivoting every transaction.
+# Like the transaction table it is keyed by epoch day and sums integer
+# cents, so totals are exact however many deltas are applied (see units.py).
+TABLE = "daily_category_totals"
+
+CREATE_SQL = f"""
+CREATE TABLE IF NOT EXISTS {TABLE} (
+    day INTEGER NOT NULL,
+    category VARCHAR(50) NOT NULL,
+    total_cents INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    min_cents INTEGER NOT NULL,
+    max_cents INTEGER NOT NULL,
+    PRIMARY KEY (day, category)
+)
+"""
+
+UPSERT_SQL = f"""
+INSERT INTO {TABLE} (day, category, total_cents, count, min_cents, max_cents)
+VALUES (?1, ?2, ?3, 1, ?3, ?3)
+ON CONFLICT (day, category) DO UPDATE SET
+    total_cents = total_cents + excluded.total_cents,
+    count = count + 1,
+    min_cents = MIN(min_cents, excluded.min_cents),
+    max_cents = MAX(max_cents, excluded.max_cents)
+"""
+
+# --- Table Management ---
+def ensure_table(conn):
+    """Create the rollup table if needed, filling it on first creation."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (TABLE,)
+    ).fetchone()
+    if exists:
+        return False
+    conn.execute(CREATE_SQL)
+    rebuild(conn)
+    return True
+
+def rebuild(conn):
+    """Recompute the whole rollup from the transaction table."""
+    conn.execute(CREATE_SQL)
+    conn.execute(f"DELETE FROM {TABLE}")
+    conn.execute(f"""
+        INSERT INTO {TABLE} (day, category, total_cents, count, min_cents, max_cents)
+        SELECT day, category, SUM(amount_cents), COUNT(*), MIN(amount_cents), MAX(amount_cents)
+        FROM "transaction"
+        GROUP BY day, category
+    """)
+    conn.commit()
+
+# --- Incremental Maintenance ---
+# These run inside the caller's transaction and never commit themselves.
+def apply_insert(conn, rows):
+    """Fold inserted (day, category, amount_cents) rows into the rollup."""
+    conn.cursor().executemany(UPSERT_SQL, rows)
+
+def apply_delete(conn, day, category, amount_cents):
+    """Remove one deleted transaction from the rollup.
+
+    Must run after the transaction row itself is gone: min/max cannot be
+    reversed arithmetically, so when the deleted amount was the group's
+    extreme they are re-read from that one day/category group.
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        UPDATE {TABLE} SET total_cents = total_cents - ?, count = count - 1
+        WHERE day = ? AND category = ?
+    """, (amount_cents, day, category))
+    cursor.execute(f"DELETE FROM {TABLE} WHERE day = ? AND category = ? AND count <= 0",
+                   (day, category))
+    cursor.execute(f"""
+        UPDATE {TABLE} SET
+            min_cents = (SELECT MIN(amount_cents) FROM "transaction" WHERE day = ?1 AND category = ?2),
+            max_cents = (SELECT MAX(amount_cents) FROM "transaction" WHERE day = ?1 AND category = ?2)
+        WHERE day = ?1 AND category = ?2 AND (min_cents = ?3 OR max_cents = ?3)
+    """, (day, category, amount_cents))
+
+def batch_updater(conn, column_names):
+    """Return a callback folding batches of inserted value tuples into the rollup."""
+    day_idx, category_idx, cents_idx = (
+        column_names.index(name) for name in ("day", "category", "amount_cents")
+    )
+
+    def apply(batch):
+        apply_insert(conn, ((row[day_idx], row[category_idx], row[cents_idx]) for row in batch))
+
+    return apply
+
+# --- Readers ---
+def fetch_daily_totals(conn, start_day=None, end_day=None, categories=None):
+    """Per-day category totals shaped like the raw (amount_cents, category, day) frame.
+
+    Optional inclusive epoch-day bounds and a category list are applied in SQL.
+    """
+    ensure_table(conn)
+    clauses, params = [], []
+    if start_day is not None:
+        clauses.append("day >= ?")
+        params.append(start_day)
+    if end_day is not None:
+        clauses.append("day <= ?")
+        params.append(end_day)
+    if categories:
+        clauses.append(f"category IN ({', '.join('?' for _ in categories)})")
+        params.extend(categories)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return pd.read_sql_query(
+        f"SELECT total_cents AS amount_cents, category, day FROM {TABLE} {where} ORDER BY day",
+        conn, params=params,
+    )
+
+def fetch_bounds(conn):
+    """(first day, last day, sorted categories) present in the rollup."""
+    ensure_table(conn)
+    first, last = conn.execute(f"SELECT MIN(day), MAX(day) FROM {TABLE}").fetchone()
+    categories = [row[0] for row in conn.execute(f"SELECT DISTINCT category FROM {TABLE} ORDER BY category")]
+    return first, last, categories
+
+def fetch_category_totals(conn, start_day, end_day):
+    """[(category, total cents)] over an inclusive epoch-day range, largest first."""
+    ensure_table(conn)
+    return conn.execute(f"""
+        SELECT category, SUM(total_cents) AS total FROM {TABLE}
+        WHERE day BETWEEN ? AND ?
+        GROUP BY category
+        ORDER BY total DESC
+    """, (start_day, end_day)).fetchall()
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    import storage
+
+    db_file = sys.argv[1] if len(sys.argv) > 1 else "database.sqlite"
+    conn = storage.connect(db_file)
+    rebuild(conn)
+    rows, = conn.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()
+    conn.close()
+    print(f"Rebuilt {TABLE} ({rows} day/category rows).")
@@ -0,0 +1,89 @@
+import sys
+
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+
+# DataFrames handed to worker processes through one shared memory block
+# instead of being pickled. Numeric and datetime64 columns are stored as
+# their raw buffers and categoricals as their integer codes; only the small
+# spec (column layout, category labels) crosses the process boundary.
+
+ALIGNMENT = 64
+
+class SharedFrame:
+    """Owner side: a frame copied into a shared memory block.
+
+    Pass ``spec`` to workers, which call attach(spec). The owner must
+    close() the block once every worker is done with it.
+    """
+
+    def __init__(self, df):
+        columns, arrays, offset = [], [], 0
+        for name in df.columns:
+            series = df[name]
+            kind, labels = "values", None
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                kind, labels = "categorical", series.cat.categories.tolist()
+                values = series.cat.codes.to_numpy()
+            elif series.dtype == object or pd.api.types.is_string_dtype(series.dtype):
+                # Strings travel as codes too and come back as an object column.
+                codes, uniques = pd.factorize(series)
+                kind, labels, values = "object", uniques.tolist(), codes
+            else:
+                values = series.to_numpy()
+            values = np.ascontiguousarray(values)
+            columns.append({
+                "name": name,
+                "kind": kind,
+                "dtype": values.dtype.str,
+                "offset": offset,
+                "labels": labels,
+            })
+            arrays.append(values)
+            offset += -(-values.nbytes // ALIGNMENT) * ALIGNMENT
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for column, values in zip(columns, arrays):
+            target = np.ndarray(values.shape, dtype=values.dtype, buffer=self.shm.buf, offset=column["offset"])
+            target[...] = values
+        self.spec = {"shm": self.shm.name, "rows": len(df), "columns": columns}
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _open(name):
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Pool workers share the owner's resource tracker, so registering the
+    # block again here is a no-op and the owner's unlink still clears it.
+    return shared_memory.SharedMemory(name=name)
+
+def attach(spec):
+    """Worker side: rebuild the frame from a SharedFrame spec.
+
+    The columns are copied out (a memcpy, not an unpickle) so the block can
+    be closed straight away and the frame outlives it.
+    """
+    shm = _open(spec["shm"])
+    try:
+        data = {}
+        for column in spec["columns"]:
+            values = np.ndarray((spec["rows"],), dtype=np.dtype(column["dtype"]),
+                                buffer=shm.buf, offset=column["offset"]).copy()
+            if column["kind"] != "values":
+                # Code -1 is a missing value in both cases.
+                values = pd.Categorical.from_codes(values, categories=column["labels"])
+                if column["kind"] == "object":
+                    values = np.asarray(values.astype(object))
+            data[column["name"]] = values
+        return pd.DataFrame(data)
+    finally:
+        shm.close()
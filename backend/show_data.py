@@ -1,7 +1,8 @@
 from app import db, Transaction, app  # Import both db and Transaction
+import units
 
 # Create an app context to allow database queries
 with app.app_context():
     transactions = Transaction.query.all()
     for t in transactions:
-        print(f"ID: {t.id}, Description: {t.description}, Amount: {t.amount}, Category: {t.category}, Date: {t.date}")
+        print(f"ID: {t.id}, Description: {t.description}, Amount: {units.cents_to_amount(t.amount_cents)}, Category: {t.category}, Date: {units.day_to_date(t.day)}")
@@ -0,0 +1,150 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+# One place that decides how SQLite is opened. WAL lets readers (charts,
+# dashboard, exports) run against a consistent snapshot while the Flask app
+# writes, instead of every reader holding the writer off and vice versa.
+JOURNAL_MODE = "wal"
+
+# Applied to every connection. In WAL mode synchronous=NORMAL is durable
+# across application crashes and only risks the last commits on power loss.
+PRAGMAS = {
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    # Negative values are KiB: 64 MiB of page cache per connection.
+    "cache_size": -int(os.environ.get("SQLITE_CACHE_KIB", 64 * 1024)),
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_BYTES", 256 * 1024 * 1024)),
+    "temp_store": "MEMORY",
+    # A writer waits this long for another writer instead of failing at once.
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+}
+
+POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", 8))
+
+# Filters on /transactions and the reporting reads go by date range and/or
+# category; these cover both orders. The trailing integer amount makes
+# range totals index-only reads that never touch the table rows.
+INDEXES = {
+    "ix_transaction_day_category": ("day", "category", "amount_cents"),
+    "ix_transaction_category_day": ("category", "day", "amount_cents"),
+}
+
+# --- Connections ---
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that records each statement's execution time in metrics.
+
+    Only the execute call is timed: rows fetched afterwards are stepped
+    lazily and land in the caller's stage span instead.
+    """
+
+    def execute(self, sql, parameters=()):
+        began = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.observe_query(sql, time.perf_counter() - began)
+
+    def executemany(self, sql, seq_of_parameters):
+        began = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            metrics.observe_query(sql, time.perf_counter() - began)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection whose cursors (and shortcut executes) are instrumented.
+
+    Passed as ``factory`` to sqlite3.connect, both here and through the
+    Flask-SQLAlchemy engine's connect_args, so every statement is counted.
+    """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def configure_connection(conn):
+    """Apply the journal mode and per-connection pragmas to a DB-API connection."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+        for name, value in PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+    return conn
+
+def connect(db_file):
+    """Open a configured connection that may be handed between threads."""
+    conn = sqlite3.connect(db_file, timeout=PRAGMAS["busy_timeout"] / 1000, check_same_thread=False,
+                           factory=InstrumentedConnection)
+    return configure_connection(conn)
+
+def ensure_indexes(conn, table="transaction"):
+    """Create the reporting indexes on an existing table (create_all skips them)."""
+    for name, columns in INDEXES.items():
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({", ".join(columns)})')
+    # Refresh planner statistics only where they are missing or stale.
+    conn.execute("PRAGMA optimize")
+
+# --- Pooling ---
+class ConnectionPool:
+    """Reuses configured connections to one database file.
+
+    Connections are created on demand; at most ``max_idle`` are kept open
+    between uses. A connection is rolled back before it goes back into the
+    pool, so nobody inherits an open read snapshot or a half-done write.
+    """
+
+    def __init__(self, db_file, max_idle=POOL_SIZE):
+        self.db_file = db_file
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return connect(self.db_file)
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except (queue.Full, sqlite3.Error):
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_file):
+    """Process-wide pool for db_file."""
+    key = os.path.abspath(db_file)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(key)
+        return _pools[key]
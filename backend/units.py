@@ -0,0 +1,76 @@
+import math
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Storage units. Transactions are stored as an integer epoch day (days since
+# 1970-01-01) and integer cents, so range filters compare integers, sums
+# are exact and nothing on the read path parses a date string. The API
+# keeps speaking ISO dates and decimal amounts; these helpers convert at
+# that boundary.
+EPOCH = date(1970, 1, 1)
+CENTS = Decimal("0.01")
+
+# --- Dates ---
+def date_to_day(value):
+    """'YYYY-MM-DD' (or a date) -> epoch day."""
+    if not isinstance(value, date):
+        try:
+            value = datetime.strptime(str(value).strip(), "%Y-%m-%d").date()
+        except ValueError:
+            raise ValueError("'date' must be formatted as YYYY-MM-DD") from None
+    elif isinstance(value, datetime):
+        value = value.date()
+    return (value - EPOCH).days
+
+def day_to_date(day):
+    """Epoch day -> 'YYYY-MM-DD'."""
+    return (EPOCH + timedelta(days=int(day))).isoformat()
+
+# --- Amounts ---
+def _decimal(value, name="amount"):
+    """Parse value as a finite Decimal; errors name the field or parameter ``name``."""
+    try:
+        amount = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f"'{name}' must be a number") from None
+    if not amount.is_finite():
+        raise ValueError(f"'{name}' must be a number")
+    return amount
+
+def amount_to_cents(value):
+    """Decimal amount -> integer cents, rounding half-cents away from zero."""
+    return int(_decimal(value).quantize(CENTS, rounding=ROUND_HALF_UP) * 100)
+
+def min_amount_to_cents(value, name="min_amount"):
+    """Smallest cent count >= value, for 'amount >= value' filters."""
+    return math.ceil(_decimal(value, name) * 100)
+
+def max_amount_to_cents(value, name="max_amount"):
+    """Largest cent count <= value, for 'amount <= value' filters."""
+    return math.floor(_decimal(value, name) * 100)
+
+def cents_to_amount(cents):
+    """Integer cents -> float amount as the API returns it."""
+    return int(cents) / 100
+
+# --- Records ---
+# API field -> (storage column, to storage, from storage).
+API_FIELDS = {
+    "date": ("day", date_to_day, day_to_date),
+    "amount": ("amount_cents", amount_to_cents, cents_to_amount),
+}
+
+# Storage column -> (API field, to storage).
+STORAGE_COLUMNS = {
+    column: (field, to_storage) for field, (column, to_storage, _) in API_FIELDS.items()
+}
+
+def to_api(mapping):
+    """Storage row mapping -> API dict, keeping the column order."""
+    record = {}
+    for name, value in mapping.items():
+        field = STORAGE_COLUMNS.get(name, (name,))[0]
+        if field in API_FIELDS and value is not None:
+            value = API_FIELDS[field][2](value)
+        record[field] = value
+    return record
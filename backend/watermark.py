@@ -0,0 +1,28 @@
+import sqlite3
+
+# Monotonic data version. Every write path bumps it inside its own
+# transaction, so anything derived from the data (figures, plot artifacts)
+# can be keyed on it and reused for as long as it has not moved.
+TABLE = "data_watermark"
+
+CREATE_SQL = f"""
+CREATE TABLE IF NOT EXISTS {TABLE} (
+    id INTEGER NOT NULL PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+)
+"""
+
+def ensure_table(conn):
+    conn.execute(CREATE_SQL)
+    conn.execute(f"INSERT OR IGNORE INTO {TABLE} (id, version) VALUES (1, 0)")
+
+def bump(conn):
+    """Advance the watermark; runs inside the caller's transaction."""
+    conn.cursor().execute(f"UPDATE {TABLE} SET version = version + 1 WHERE id = 1")
+
+def read(conn):
+    try:
+        row = conn.execute(f"SELECT version FROM {TABLE} WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:  # table not created yet
+        return 0
+    return 0 if row is None else row[0]